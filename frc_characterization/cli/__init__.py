@@ -1,20 +1,16 @@
 # The CLI entry point for the characterization toolsuite.
+#
+# Each tool is only imported once it has been chosen, so that starting one
+# tool doesn't pay for loading all of the others.
 
 import argparse
+import os
+from importlib import import_module
 from os import getcwd
 from sys import argv
 from functools import partial
 
-import argcomplete
-import frc_characterization
-import frc_characterization.logger_analyzer.data_analyzer as analyzer
-import frc_characterization.logger_analyzer.data_logger as logger
-import frc_characterization.logger_gui as logger_gui
-import frc_characterization.newproject as newproject
-from frc_characterization.newproject import Tests
-
-from consolemenu import ConsoleMenu
-from consolemenu.items import FunctionItem, SubmenuItem
+from frc_characterization.constants import Tests
 
 langs = ("java", "cpp", "python")
 
@@ -22,37 +18,66 @@ controllers = ("spark", "talonsrx")
 
 
 def new_project(testType, directory=None):
+    newproject = import_module("frc_characterization.newproject")
     newproject.main(testType)
 
 
-def get_analyzer(directory=None):
-    analyzer.main(directory or getcwd())
+def get_analyzer(directory=None, cache_dir=None):
+    analyzer = import_module("frc_characterization.logger_analyzer.data_analyzer")
+    analyzer.main(directory or getcwd(), cache_dir=cache_dir)
 
 
 def get_logger(testType, directory=None):
+    logger_gui = import_module("frc_characterization.logger_gui")
+    logger = import_module("frc_characterization.logger_analyzer.data_logger")
     logger_gui.main(0, directory or getcwd(), logger.TestRunner, test=testType)
 
 
+def get_batch(
+    testType,
+    directory=None,
+    output="characterization-results.csv",
+    jobs=None,
+    window_size=8,
+    motion_threshold=0.2,
+    max_replay_error=None,
+):
+    batch = import_module("frc_characterization.logger_analyzer.batch")
+    batch.main(
+        [directory or getcwd()],
+        output,
+        jobs=jobs,
+        test=testType,
+        window=window_size,
+        motion_threshold=motion_threshold,
+        max_replay_error=max_replay_error,
+    )
+
+
 tool_dict = {
     "drive": {
         "new": partial(new_project, testType=Tests.DRIVETRAIN),
         "logger": partial(get_logger, testType=Tests.DRIVETRAIN),
         "analyzer": get_analyzer,
+        "batch": partial(get_batch, testType=Tests.DRIVETRAIN),
     },
     "arm": {
         "new": partial(new_project, testType=Tests.ARM),
         "logger": partial(get_logger, testType=Tests.ARM),
         "analyzer": get_analyzer,
+        "batch": partial(get_batch, testType=Tests.ARM),
     },
     "elevator": {
         "new": partial(new_project, testType=Tests.ELEVATOR),
         "logger": partial(get_logger, testType=Tests.ELEVATOR),
         "analyzer": get_analyzer,
+        "batch": partial(get_batch, testType=Tests.ELEVATOR),
     },
     "simple-motor": {
         "new": partial(new_project, testType=Tests.SIMPLE_MOTOR),
         "logger": partial(get_logger, testType=Tests.SIMPLE_MOTOR),
         "analyzer": get_analyzer,
+        "batch": partial(get_batch, testType=Tests.SIMPLE_MOTOR),
     },
 }
 
@@ -60,6 +85,9 @@ tool_dict = {
 def main():
 
     if len(argv) < 2:
+        from consolemenu import ConsoleMenu
+        from consolemenu.items import FunctionItem, SubmenuItem
+
         menu = ConsoleMenu(
             "Mechanism Types", "Choose which mechanism you are characterizing"
         )
@@ -83,18 +111,78 @@ def main():
         parser.add_argument(
             "tool_type",
             choices=list(list(tool_dict.values())[0].keys()),
-            help="Create new project, start data recorder/logger, or start data analyzer",
+            help="Create new project, start data recorder/logger, start data analyzer, "
+            + "or analyze many data files at once",
         )
         parser.add_argument(
             "project_directory",
-            help="Location for the project directory (if creating a new project)",
+            help="Location for the project directory (if creating a new project), "
+            + "or the data files to analyze (a file, directory or glob pattern) "
+            + "for batch",
             nargs="?",
             default=None,
         )
-        argcomplete.autocomplete(parser)
+
+        batch_args = parser.add_argument_group("batch options")
+        batch_args.add_argument(
+            "--output",
+            default="characterization-results.csv",
+            help="CSV file to write the batch results to",
+        )
+        batch_args.add_argument(
+            "--jobs",
+            type=int,
+            default=None,
+            help="Number of worker processes (default: number of CPUs)",
+        )
+        batch_args.add_argument(
+            "--window_size", type=int, default=8, help="Acceleration window size"
+        )
+        batch_args.add_argument(
+            "--motion_threshold",
+            type=float,
+            default=0.2,
+            help="Motion threshold of the quasistatic tests",
+        )
+        batch_args.add_argument(
+            "--max_replay_error",
+            type=float,
+            default=None,
+            help="Reject fits whose RMS velocity error when replayed against the "
+            + "runs, relative to the RMS velocity, is above this (e.g. 0.1)",
+        )
+
+        analyzer_args = parser.add_argument_group("analyzer options")
+        analyzer_args.add_argument(
+            "--cache_dir",
+            default=None,
+            help="Directory to keep prepared data in, so that reopening a session "
+            + "with the same settings doesn't prepare it again",
+        )
+
+        # argcomplete only does anything when invoked by the shell completion
+        # script, which sets this variable
+        if "_ARGCOMPLETE" in os.environ:
+            import argcomplete
+
+            argcomplete.autocomplete(parser)
 
         args = parser.parse_args()
-        tool_dict[args.mech_type][args.tool_type](directory=args.project_directory)
+        if args.tool_type == "batch":
+            tool_dict[args.mech_type][args.tool_type](
+                directory=args.project_directory,
+                output=args.output,
+                jobs=args.jobs,
+                window_size=args.window_size,
+                motion_threshold=args.motion_threshold,
+                max_replay_error=args.max_replay_error,
+            )
+        elif args.tool_type == "analyzer":
+            tool_dict[args.mech_type][args.tool_type](
+                directory=args.project_directory, cache_dir=args.cache_dir
+            )
+        else:
+            tool_dict[args.mech_type][args.tool_type](directory=args.project_directory)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,49 @@
+# Mechanism and unit definitions shared by all of the tools.
+#
+# This module is imported by everything (including the data logger and the
+# headless analysis code), so it must stay cheap to import: pint takes a while
+# to import and to build its unit registry, so that only happens the first
+# time a unit is actually used.
+
+import functools
+from enum import Enum
+
+
+class Tests(Enum):
+    ARM = "Arm"
+    ELEVATOR = "Elevator"
+    DRIVETRAIN = "Drivetrain"
+    SIMPLE_MOTOR = "Simple"
+
+
+@functools.lru_cache(maxsize=None)
+def unit_registry():
+    """
+    :returns: the pint unit registry used by Units, created on first use
+    """
+    import pint
+
+    return pint.UnitRegistry()
+
+
+class Units(Enum):
+    FEET = "Feet", "foot"
+    METERS = "Meters", "meter"
+    INCHES = "Inches", "inch"
+    RADIANS = "Radians", "radian"
+    DEGREES = "Degrees", "degree"
+    ROTATIONS = "Rotations", "revolution"
+
+    def __new__(cls, *values):
+        obj = object.__new__(cls)
+        # first value is canonical value
+        obj._value_ = values[0]
+
+        # name of the unit in the pint registry
+        obj.unit_name = values[1]
+        return obj
+
+    @property
+    def unit(self):
+        """the pint unit"""
+        return getattr(unit_registry(), self.unit_name)
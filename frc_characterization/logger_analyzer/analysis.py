@@ -0,0 +1,1337 @@
+# The analysis engine behind the data analyzer.  Everything in here works on
+# NumPy arrays and plain parameters, so it can run without a GUI (e.g. in
+# worker processes or on headless machines); the Tkinter analyzer is only a
+# front end for these functions.
+#
+# Functions raise AnalysisError when the data can't be analyzed with the given
+# parameters; the message is meant to be shown to the user as-is.
+
+import collections.abc
+import functools
+import math
+
+import numpy as np
+from frc_characterization.constants import Tests, Units
+from frc_characterization.logger_analyzer import lqr
+from frc_characterization.logger_analyzer.columns import (
+    TIME_COL,
+    BATTERY_COL,
+    AUTOSPEED_COL,
+    L_VOLTS_COL,
+    R_VOLTS_COL,
+    L_ENCODER_P_COL,
+    R_ENCODER_P_COL,
+    L_ENCODER_V_COL,
+    R_ENCODER_V_COL,
+    GYRO_ANGLE_COL,
+    PREPARED_TM_COL,
+    PREPARED_V_COL,
+    PREPARED_POS_COL,
+    PREPARED_VEL_COL,
+    PREPARED_ACC_COL,
+    PREPARED_COS_COL,
+    PREPARED_MAX_COL,
+    LEFT_COLS,
+    RIGHT_COLS,
+    JSON_DATA_KEYS,
+)
+
+_EPS = np.finfo(float).eps
+
+
+class AnalysisError(Exception):
+    """Raised when the data can't be analyzed with the given parameters"""
+
+    pass
+
+
+def is_rotation(units):
+    return Units(units) in (Units.ROTATIONS, Units.RADIANS, Units.DEGREES)
+
+
+def convert_units_per_rot(init_units, final_units, units_per_rot):
+    """
+    Converts a units-per-rotation factor recorded in init_units to final_units.
+    Rotational units always use the fixed conversion from rotations.
+    """
+    init_units = Units(init_units)
+    final_units = Units(final_units)
+    if is_rotation(final_units):
+        return round((1 * Units.ROTATIONS.unit).to(final_units.unit).magnitude, 3)
+    else:
+        data_units_per_rot = units_per_rot * init_units.unit
+        return round(data_units_per_rot.to(final_units.unit).magnitude, 3)
+
+
+def arm_angle(position, units):
+    """
+    :param position: position of an arm, in units
+    :param units: the Units value of the position
+    :returns: the angle of the arm in radians
+    """
+    units = Units(units)
+    if units == Units.DEGREES:
+        return np.radians(position)
+    elif units == Units.RADIANS:
+        return position
+    else:
+        return math.pi * 2 * position
+
+
+# From 449's R script (note: R is 1-indexed)
+
+
+def smooth_derivative(tm, value, n, out=None):
+    """
+    :param tm: time column
+    :param value: Value to take the derivative of
+    :param n: smoothing parameter
+    :param out: optional array of the same length as value to write into
+    """
+    dlen = len(value)
+    if out is None:
+        out = np.empty(dlen)
+
+    # pad to original length by adding zeros on either side
+    start = int(np.ceil(n / 2.0))
+    end = start + dlen - n
+    out[:start] = 0
+    out[end:] = 0
+
+    x = out[start:end]
+    np.subtract(value[n:dlen], value[: (dlen - n)], out=x)
+    x /= tm[n:dlen] - tm[: (dlen - n)]
+    return out
+
+
+# Create one for one sided and one for 2 sided
+def trim_quasi_testdata(data, test, motion_threshold, units_per_rot):
+    """
+    :param data: raw test data, indexed by the *_COL constants
+    :param test: the Tests value of the mechanism
+    :param motion_threshold: minimum velocity of the mechanism, in converted
+                             units
+    :param units_per_rot: conversion factor from recorded to converted units
+    :returns: indices of the samples in which the mechanism is moving
+    """
+    test = Tests(test)
+    if test == Tests.DRIVETRAIN:
+        truth = np.all(
+            [
+                np.abs(data[L_ENCODER_V_COL] * units_per_rot) > motion_threshold,
+                np.abs(data[L_VOLTS_COL]) > 0,
+                np.abs(data[R_ENCODER_V_COL] * units_per_rot) > motion_threshold,
+                np.abs(data[R_VOLTS_COL]) > 0,
+            ],
+            axis=0,
+        )
+    else:
+        truth = np.all(
+            [
+                np.abs(data[L_ENCODER_V_COL] * units_per_rot) > motion_threshold,
+                np.abs(data[L_VOLTS_COL]) > 0,
+            ],
+            axis=0,
+        )
+
+    temp = np.flatnonzero(truth)
+
+    if temp.size == 0:
+        raise AnalysisError(
+            "No data in quasistatic test is above motion threshold. "
+            + "Try running with a smaller motion threshold (use --motion_threshold) "
+            + "and make sure your encoder is reporting correctly!"
+        )
+    return temp
+
+
+def trim_step_testdata(data):
+    # removes anything before the max acceleration
+    max_accel_idx = np.argmax(np.abs(data[PREPARED_ACC_COL]))
+    return data[:, max_accel_idx + 1 :]
+
+
+def compute_accel(data, cols, window, test, units, units_per_rot, idx=None, out=None):
+    """
+    Builds the prepared data for one side of the mechanism.  The raw data is
+    only read; the result is written into out, or a newly allocated array.
+
+    :param data: raw test data, indexed by the *_COL constants
+    :param cols: (volts, position, velocity) columns of the side to use
+    :param window: smoothing window for the acceleration
+    :param test: the Tests value of the mechanism
+    :param units: the Units value the results are converted to
+    :param units_per_rot: conversion factor from recorded to converted units
+    :param idx: indices of the samples to use, or None to use all of them
+    :param out: optional (columns, samples) array to write the result into
+
+    Returned data columns correspond to PREPARED_*
+    """
+    volts_col, pos_col, vel_col = cols
+    dlen = len(data[TIME_COL]) if idx is None else len(idx)
+
+    # deal with incomplete data
+    if dlen < window * 2:
+        raise AnalysisError(
+            "Not enough data points to compute acceleration. "
+            + "Try running with a smaller window setting or a smaller threshold."
+        )
+
+    test = Tests(test)
+    rows = PREPARED_COS_COL + 1 if test == Tests.ARM else PREPARED_MAX_COL + 1
+    prepared = np.empty((rows, dlen)) if out is None else out
+
+    for src, dest in (
+        (TIME_COL, PREPARED_TM_COL),
+        (volts_col, PREPARED_V_COL),
+        (pos_col, PREPARED_POS_COL),
+        (vel_col, PREPARED_VEL_COL),
+    ):
+        if idx is None:
+            prepared[dest] = data[src]
+        else:
+            np.take(data[src], idx, out=prepared[dest])
+
+    # ensure voltage sign matches velocity sign and converts rotation
+    # measurements into proper units
+    np.copysign(
+        prepared[PREPARED_V_COL],
+        prepared[PREPARED_VEL_COL],
+        out=prepared[PREPARED_V_COL],
+    )
+    prepared[PREPARED_POS_COL] *= units_per_rot
+    prepared[PREPARED_VEL_COL] *= units_per_rot
+
+    smooth_derivative(
+        prepared[PREPARED_TM_COL],
+        prepared[PREPARED_VEL_COL],
+        window,
+        out=prepared[PREPARED_ACC_COL],
+    )
+
+    if test == Tests.ARM:
+        angle = arm_angle(prepared[PREPARED_POS_COL], units)
+        np.cos(angle, out=prepared[PREPARED_COS_COL])
+
+    return prepared
+
+
+# The subsets of the data that are analyzed, as the (quasistatic, dynamic)
+# pieces of data they are made of.  Pieces are named after the run they come
+# from ("sf" is slow-forward, "fb" is fast-backward, ...) and, for drivetrains,
+# the side of the robot.
+#
+# The pieces of each test are stored next to each other in the order given by
+# get_pieces (see PreparedData), so the pieces of a subset must be consecutive
+# in that order.
+SUBSETS = {
+    "Forward": (("sf",), ("ff",)),
+    "Backward": (("sb",), ("fb",)),
+    "Combined": (("sf", "sb"), ("ff", "fb")),
+}
+
+DRIVETRAIN_SUBSETS = {
+    "Forward Left": (("sfl",), ("ffl",)),
+    "Forward Right": (("sfr",), ("ffr",)),
+    "Backward Left": (("sbl",), ("fbl",)),
+    "Backward Right": (("sbr",), ("fbr",)),
+    "Forward Combined": (("sfl", "sfr"), ("ffl", "ffr")),
+    "Backward Combined": (("sbl", "sbr"), ("fbl", "fbr")),
+    "All Combined": (("sfl", "sfr", "sbl", "sbr"), ("ffl", "ffr", "fbl", "fbr")),
+}
+
+
+def get_subsets(test):
+    """
+    :returns: SUBSETS or DRIVETRAIN_SUBSETS, depending on the test
+    """
+    return DRIVETRAIN_SUBSETS if Tests(test) == Tests.DRIVETRAIN else SUBSETS
+
+
+def get_sides(test):
+    """
+    :returns: dict of piece name suffix -> (volts, position, velocity)
+              columns of each side of the mechanism
+    """
+    if Tests(test) == Tests.DRIVETRAIN:
+        return {"l": LEFT_COLS, "r": RIGHT_COLS}
+    return {"": LEFT_COLS}
+
+
+def get_pieces(test):
+    """
+    :returns: the (quasistatic, dynamic) pieces of the test, in the order
+              they are stored in
+    """
+    sides = get_sides(test)
+    return (
+        tuple(run + side for run in ("sf", "sb") for side in sides),
+        tuple(run + side for run in ("ff", "fb") for side in sides),
+    )
+
+
+class PreparedData(collections.abc.Mapping):
+    """
+    The prepared data of every subset of a test: a read-only mapping of
+    subset name -> [quasistatic, dynamic] prepared data.
+
+    All quasistatic pieces are stored in one (columns, samples) buffer, and
+    all dynamic pieces in another, so every subset is a range of samples of
+    the buffers.  The data of a subset is a view of the buffers that is
+    created the first time the subset is used; nothing is copied.
+    """
+
+    def __init__(self, test, quasi, step, lengths):
+        """
+        :param test: the Tests value of the mechanism
+        :param quasi: quasistatic buffer, with the pieces in get_pieces order
+        :param step: dynamic buffer, with the pieces in get_pieces order
+        :param lengths: (2, pieces) array with the number of samples of each
+                        quasistatic and dynamic piece
+        """
+        self.test = Tests(test)
+        self.quasi = quasi
+        self.step = step
+        self.lengths = np.asarray(lengths, dtype=int)
+
+        self.bounds = {}
+        for names, row in zip(get_pieces(self.test), self.lengths):
+            stops = np.cumsum(row)
+            for name, start, stop in zip(names, stops - row, stops):
+                self.bounds[name] = (int(start), int(stop))
+
+        self.subsets = get_subsets(self.test)
+        self._views = {}
+
+    def __getitem__(self, subset):
+        views = self._views.get(subset)
+        if views is None:
+            qu, step = self.subsets[subset]
+            views = self._views[subset] = [
+                self.quasi[:, self.bounds[qu[0]][0] : self.bounds[qu[-1]][1]],
+                self.step[:, self.bounds[step[0]][0] : self.bounds[step[-1]][1]],
+            ]
+        return views
+
+    def __iter__(self):
+        return iter(self.subsets)
+
+    def __len__(self):
+        return len(self.subsets)
+
+
+def prepare_data(data, test, window, motion_threshold, units, units_per_rot):
+    """
+    Firstly, data should be 'trimmed' to exclude any data points at which the
+    robot was not being commanded to do anything.
+
+    Secondly, robot acceleration should be calculated from robot velocity and time.
+    We have found it effective to do this by taking the slope of the secant line
+    of velocity over a 60ms (3 standard loop iterations) window.
+
+    Thirdly, data from the quasi-static test should be trimmed to exclude the
+    initial period in which the robot is not moving due to static friction
+    Fourthly, data from the step-voltage acceleration tests must be trimmed to
+    remove the initial 'ramp-up' period that exists due to motor inductance; this
+    can be done by simply removing all data points before maximum acceleration is
+    reached.
+
+    Finally, the data can be analyzed: pool your trimmed data into four data sets
+    - one for each side of the robot (left or right) and each direction (forwards
+    or backwards).
+
+    For each set, run a linear regression of voltage seen at the motor
+    (or battery voltage if you do not have Talon SRXs) versus velocity and
+    acceleration.
+
+    Voltage should be in units of volts, velocity in units of feet per second,
+    and acceleration in units of feet per second squared.
+
+    Each data pool will then yield three parameters -
+    intercept, Kv (the regression coefficient of velocity), and Ka (the regression
+    coefficient of acceleration).
+
+    The data is never modified (it may be a read-only memory map); the
+    prepared data is newly allocated.
+
+    :param data: dict of (columns, samples) arrays for each of JSON_DATA_KEYS
+    :param test: the Tests value of the mechanism
+    :param window: smoothing window for the acceleration
+    :param motion_threshold: minimum velocity of the quasistatic data, in
+                             converted units
+    :param units: the Units value the results are converted to
+    :param units_per_rot: conversion factor from recorded to converted units
+    :returns: PreparedData of the test
+    """
+    test = Tests(test)
+    sides = get_sides(test)
+    quasi_pieces, step_pieces = get_pieces(test)
+    rows = PREPARED_COS_COL + 1 if test == Tests.ARM else PREPARED_MAX_COL + 1
+
+    runs = {
+        "sf": "slow-forward",
+        "sb": "slow-backward",
+        "ff": "fast-forward",
+        "fb": "fast-backward",
+    }
+
+    # trim quasi data before computing acceleration
+    trims = {
+        run: trim_quasi_testdata(data[runs[run]], test, motion_threshold, units_per_rot)
+        for run in ("sf", "sb")
+    }
+
+    # The length of the trimmed quasistatic data is known, so it is prepared
+    # in place
+    lengths = np.empty((2, len(quasi_pieces)), dtype=int)
+    lengths[0] = [len(trims[name[:2]]) for name in quasi_pieces]
+    quasi = np.empty((rows, lengths[0].sum()))
+    start = 0
+    for name, length in zip(quasi_pieces, lengths[0]):
+        compute_accel(
+            data[runs[name[:2]]],
+            sides[name[2:]],
+            window,
+            test,
+            units,
+            units_per_rot,
+            trims[name[:2]],
+            out=quasi[:, start : start + length],
+        )
+        start += length
+
+    # trim step data after computing acceleration
+    step = [
+        trim_step_testdata(
+            compute_accel(
+                data[runs[name[:2]]],
+                sides[name[2:]],
+                window,
+                test,
+                units,
+                units_per_rot,
+            )
+        )
+        for name in step_pieces
+    ]
+    lengths[1] = [piece.shape[1] for piece in step]
+    step = np.concatenate(step, axis=1)
+
+    return PreparedData(test, quasi, step, lengths)
+
+
+class OLSResult:
+    """
+    Least-squares fit of y = x @ params.  This computes only what the
+    analysis needs (the parameters and r^2) from a single SVD of the design
+    matrix; standard errors are computed on first access.
+
+    The results match statsmodels' OLS(y, x).fit(): the parameters are the
+    pseudoinverse solution with the same singular value cutoff, and r^2 is
+    centered only if x contains a constant, either as a column or implicitly
+    (e.g. as the sum of indicator columns).
+    """
+
+    # Relative cutoff of small singular values, as used by statsmodels
+    rcond = 1e-15
+
+    def __init__(self, x, y):
+        u, s, vt = np.linalg.svd(x, full_matrices=False)
+        keep = s > self.rcond * s.max()
+        self.v_scaled = vt[keep].T / s[keep]
+        self.params = self.v_scaled @ (u[:, keep].T @ y)
+
+        resid = y - x @ self.params
+        self.ssr = resid @ resid
+        self.rank = int(np.count_nonzero(s > s.max() * len(s) * _EPS))
+        self.df_resid = x.shape[0] - self.rank
+
+        if self._has_constant(x, u, s):
+            centered = y - y.mean()
+            tss = centered @ centered
+        else:
+            tss = y @ y
+        self.rsquared = 1 - self.ssr / tss
+
+        self._bse = None
+
+    @staticmethod
+    def _has_constant(x, u, s):
+        for col in x.T:
+            if col[0] != 0 and np.all(col == col[0]):
+                return True
+
+        # Look for an implicit constant: a column of ones lies in the column
+        # space of x, i.e. appending it doesn't increase the rank of x.  The
+        # tolerances are those of numpy.linalg.matrix_rank.
+        n = x.shape[0]
+        basis = u[:, s > s.max() * max(x.shape) * _EPS]
+        ones = np.ones(n)
+        resid = ones - basis @ (basis.T @ ones)
+        tol = np.sqrt(s.max() ** 2 + n) * max(n, x.shape[1] + 1) * _EPS
+        return np.sqrt(resid @ resid) <= tol
+
+    @property
+    def bse(self):
+        """standard errors of the parameters"""
+        if self._bse is None:
+            scale = self.ssr / self.df_resid
+            self._bse = np.sqrt(scale * np.sum(np.square(self.v_scaled), axis=1))
+        return self._bse
+
+
+def ols(x1, x2, x3, y):
+    """multivariate linear regression using ordinary least squares"""
+    # Regressors are stored as contiguous columns, which is the layout LAPACK
+    # works on
+    x = np.empty((len(x1), 3 if x3 is None else 4), order="F")
+    np.sign(x1, out=x[:, 0])
+    x[:, 1] = x1
+    x[:, 2] = x2
+    if x3 is not None:
+        x[:, 3] = x3
+    return OLSResult(x, y)
+
+
+def calc_fit(qu, step, test):
+    """
+    Fits the feedforward model of the mechanism to one prepared subset.
+
+    :returns: (kg, ks, kv, ka, rsquare) for elevators,
+              (ks, kv, ka, kcos, rsquare) for arms and
+              (ks, kv, ka, rsquare) otherwise
+    """
+    vel = np.concatenate((qu[PREPARED_VEL_COL], step[PREPARED_VEL_COL]))
+    accel = np.concatenate((qu[PREPARED_ACC_COL], step[PREPARED_ACC_COL]))
+    volts = np.concatenate((qu[PREPARED_V_COL], step[PREPARED_V_COL]))
+
+    test = Tests(test)
+    if test == Tests.ELEVATOR:
+        fit = ols(vel, accel, np.ones(vel.size), volts)
+        ks, kv, ka, kg = fit.params
+        rsquare = fit.rsquared
+        return kg, ks, kv, ka, rsquare
+    elif test == Tests.ARM:
+        cos = np.concatenate((qu[PREPARED_COS_COL], step[PREPARED_COS_COL]))
+        fit = ols(vel, accel, cos, volts)
+        ks, kv, ka, kcos = fit.params
+        rsquare = fit.rsquared
+        return ks, kv, ka, kcos, rsquare
+    else:
+        fit = ols(vel, accel, None, volts)
+        ks, kv, ka = fit.params
+        rsquare = fit.rsquared
+    return ks, kv, ka, rsquare
+
+
+def fit_params(test):
+    """
+    :returns: names of the values returned by calc_fit for the given test
+    """
+    test = Tests(test)
+    if test == Tests.ELEVATOR:
+        return ("kg", "ks", "kv", "ka", "r_square")
+    elif test == Tests.ARM:
+        return ("ks", "kv", "ka", "kcos", "r_square")
+    else:
+        return ("ks", "kv", "ka", "r_square")
+
+
+# Fitting many models at once (every subset, or every combination of window
+# size and motion threshold in the parameter sweep): rather than running a
+# separate regression for each model, the normal equations of every piece of
+# data (one side of one run) are computed once, added up for each subset (a
+# combined subset is just the sum of its pieces) and all of them are solved
+# in a single batched call.
+
+
+def _gram_width(test):
+    # The columns of the model, volts and ones
+    return len(fit_params(test)) - 1 + 2
+
+
+def _gram_columns(prepared, accel, test):
+    """
+    Builds the regression matrix of one piece of prepared data for every
+    window: the columns of the model (as in ols), then volts and a column of
+    ones for the statistics needed by r^2.
+
+    :param accel: (windows, samples) accelerations of the piece
+    :returns: (windows, samples, columns) array
+    """
+    test = Tests(test)
+    vel = prepared[PREPARED_VEL_COL]
+    cols = np.empty(accel.shape + (_gram_width(test),))
+    cols[..., 0] = np.sign(vel)
+    cols[..., 1] = vel
+    cols[..., 2] = accel
+    if test == Tests.ELEVATOR:
+        cols[..., 3] = 1
+    elif test == Tests.ARM:
+        cols[..., 3] = prepared[PREPARED_COS_COL]
+    cols[..., -2] = prepared[PREPARED_V_COL]
+    cols[..., -1] = 1
+    return cols
+
+
+def _sweep_gram(data, cols, windows, test, units, units_per_rot, idx=None):
+    """
+    Computes the normal equations of one side of one run for every window.
+    Quasistatic data is given its trimmed indices; dynamic data is trimmed
+    after the acceleration is computed, as in prepare_data.
+
+    :returns: (windows, columns, columns) array, NaN for windows that don't
+              fit in the data
+    """
+    dlen = len(data[TIME_COL]) if idx is None else len(idx)
+    valid = dlen >= 2 * windows
+    if not valid.any():
+        width = _gram_width(test)
+        return np.full((len(windows), width, width), np.nan)
+
+    # Everything except the acceleration is the same for every window
+    prepared = compute_accel(
+        data, cols, int(windows[valid].min()), test, units, units_per_rot, idx
+    )
+    accel = np.zeros((len(windows), dlen))
+    for i, window in enumerate(windows):
+        if valid[i]:
+            smooth_derivative(
+                prepared[PREPARED_TM_COL],
+                prepared[PREPARED_VEL_COL],
+                window,
+                out=accel[i],
+            )
+
+    x = _gram_columns(prepared, accel, test)
+    if idx is None:
+        # Drop everything up to the maximum acceleration of each window
+        start = np.argmax(np.abs(accel), axis=1) + 1
+        x *= (np.arange(dlen) >= start[:, np.newaxis])[..., np.newaxis]
+
+    gram = np.matmul(x.transpose(0, 2, 1), x)
+    gram[~valid] = np.nan
+    return gram
+
+
+def _solve_gram(gram, test):
+    """
+    Solves the accumulated normal equations.
+
+    :param gram: (..., columns, columns) array of the normal equations of the
+                 columns from _gram_columns
+    :returns: (..., values) array with the values of calc_fit
+    """
+    test = Tests(test)
+    k = gram.shape[-1] - 2
+    out = np.full(gram.shape[:-2] + (k + 1,), np.nan)
+    valid = np.isfinite(gram).all(axis=(-2, -1))
+    gram = gram[valid]
+
+    xtx = gram[:, :k, :k]
+    xty = gram[:, :k, k]
+    yty = gram[:, k, k]
+    sum_y = gram[:, k, k + 1]
+    n = gram[:, k + 1, k + 1]
+
+    # Equilibrate the columns before taking the pseudoinverse, so that the
+    # singular value cutoff doesn't depend on the scale of the data
+    scale = np.sqrt(np.diagonal(xtx, axis1=1, axis2=2))
+    scale[scale == 0] = 1
+    outer = scale[:, :, np.newaxis] * scale[:, np.newaxis, :]
+    params = np.linalg.pinv(xtx / outer, rcond=1e-12, hermitian=True)
+    params = np.einsum("wij,wj->wi", params, xty / scale) / scale
+
+    ssr = np.maximum(yty - np.einsum("wi,wi->w", params, xty), 0)
+
+    # r^2 is centered if the model contains a constant: the intercept of the
+    # elevator, or the sign of the velocity when it never changes
+    has_constant = np.abs(gram[:, 0, k + 1]) == n
+    if test == Tests.ELEVATOR:
+        has_constant[:] = True
+    tss = np.where(has_constant, yty - np.square(sum_y) / n, yty)
+    rsquared = 1 - ssr / tss
+
+    # Same order as calc_fit
+    if test == Tests.ELEVATOR:
+        params = params[:, [3, 0, 1, 2]]
+    out[valid] = np.column_stack((params, rsquared))
+    return out
+
+
+def sweep(data, test, windows, motion_thresholds, units, units_per_rot):
+    """
+    Fits the feedforward model to every subset for every combination of
+    window size and motion threshold.  Combinations that prepare_data would
+    reject give NaN.
+
+    :param data: dict of (columns, samples) arrays for each of JSON_DATA_KEYS
+    :param test: the Tests value of the mechanism
+    :param windows: window sizes to try
+    :param motion_thresholds: motion thresholds to try
+    :param units: the Units value the results are converted to
+    :param units_per_rot: conversion factor from recorded to converted units
+    :returns: dict of subset name -> dict of value name (see fit_params) ->
+              (windows, thresholds) array
+    """
+    test = Tests(test)
+    windows = np.asarray(windows, dtype=int)
+    thresholds = np.asarray(motion_thresholds, dtype=float)
+    sides = get_sides(test)
+
+    width = _gram_width(test)
+
+    def gram(run, cols, idx=None):
+        return _sweep_gram(data[run], cols, windows, test, units, units_per_rot, idx)
+
+    # Each piece of data gets a (windows, thresholds, width, width) array;
+    # dynamic data doesn't depend on the threshold
+    shape = (len(windows), len(thresholds), width, width)
+    grams = {}
+    for run, key in (("fast-forward", "ff"), ("fast-backward", "fb")):
+        for side, cols in sides.items():
+            grams[key + side] = np.broadcast_to(gram(run, cols)[:, np.newaxis], shape)
+
+    for run, key in (("slow-forward", "sf"), ("slow-backward", "sb")):
+        for side, cols in sides.items():
+            grams[key + side] = g = np.full(shape, np.nan)
+            for j, threshold in enumerate(thresholds):
+                try:
+                    idx = trim_quasi_testdata(data[run], test, threshold, units_per_rot)
+                except AnalysisError:
+                    continue
+                g[:, j] = gram(run, cols, idx)
+
+    # prepare_data fails if any piece of the data can't be prepared
+    invalid = np.zeros((len(windows), len(thresholds)), dtype=bool)
+    for g in grams.values():
+        invalid |= ~np.isfinite(g).all(axis=(-2, -1))
+
+    names = fit_params(test)
+    results = {}
+    for subset, (qu, step) in get_subsets(test).items():
+        total = sum(grams[piece] for piece in qu + step)
+        total[invalid] = np.nan
+        fit = _solve_gram(total, test)
+        results[subset] = {name: fit[..., i] for i, name in enumerate(names)}
+    return results
+
+
+def format_sweep(results, windows, motion_thresholds):
+    """
+    :param results: the results of sweep for a single subset
+    :returns: the results as a plain-text table, one row per combination
+    """
+    names = list(results)
+    lines = [
+        "%8s %10s " % ("window", "threshold") + " ".join("%10s" % n for n in names)
+    ]
+    for i, window in enumerate(windows):
+        for j, threshold in enumerate(motion_thresholds):
+            lines.append(
+                "%8d %10.4g " % (window, threshold)
+                + " ".join("%10.4g" % results[n][i, j] for n in names)
+            )
+    return "\n".join(lines)
+
+
+def calc_fit_all(prepared, test):
+    """
+    Fits the feedforward model to every subset at once.  The normal
+    equations of each piece of data are computed once and shared by all the
+    subsets containing it, so fitting every subset costs about as much as
+    fitting the largest one.
+
+    The results match calc_fit, except for subsets in which some parameters
+    can't be told apart (e.g. kS and kG of an elevator moving in only one
+    direction), where the minimum-norm solution is returned.
+
+    :param prepared: PreparedData from prepare_data
+    :param test: the Tests value of the mechanism
+    :returns: dict of subset name -> dict of value name (see fit_params) ->
+              value
+    """
+    test = Tests(test)
+    grams = {}
+    for buffer, names in zip((prepared.quasi, prepared.step), get_pieces(test)):
+        x = _gram_columns(buffer, buffer[PREPARED_ACC_COL], test)
+        for name in names:
+            start, stop = prepared.bounds[name]
+            grams[name] = x[start:stop].T @ x[start:stop]
+
+    subsets = list(prepared)
+    totals = np.stack(
+        [
+            sum(grams[piece] for piece in qu + step)
+            for qu, step in (prepared.subsets[subset] for subset in subsets)
+        ]
+    )
+    fits = _solve_gram(totals, test)
+
+    names = fit_params(test)
+    return {
+        subset: dict(zip(names, fit.tolist())) for subset, fit in zip(subsets, fits)
+    }
+
+
+# Pairs of subsets compared by fit_asymmetry
+ASYMMETRY_PAIRS = {
+    "Forward/Backward": ("Forward", "Backward"),
+}
+
+DRIVETRAIN_ASYMMETRY_PAIRS = {
+    "Forward Left/Right": ("Forward Left", "Forward Right"),
+    "Backward Left/Right": ("Backward Left", "Backward Right"),
+    "Left Forward/Backward": ("Forward Left", "Backward Left"),
+    "Right Forward/Backward": ("Forward Right", "Backward Right"),
+    "Combined Forward/Backward": ("Forward Combined", "Backward Combined"),
+}
+
+
+def fit_asymmetry(fits, test):
+    """
+    Compares the fits of opposite sides and directions of the mechanism.  A
+    large difference usually points at a mechanical problem on one side
+    (or in one direction), or at a bad run.
+
+    :param fits: the results of calc_fit_all
+    :param test: the Tests value of the mechanism
+    :returns: dict of comparison name -> dict of value name -> relative
+              difference, (a - b) / mean(|a|, |b|)
+    """
+    if Tests(test) == Tests.DRIVETRAIN:
+        pairs = DRIVETRAIN_ASYMMETRY_PAIRS
+    else:
+        pairs = ASYMMETRY_PAIRS
+
+    asymmetry = {}
+    for name, (a, b) in pairs.items():
+        asymmetry[name] = {}
+        for value in fit_params(test):
+            if value == "r_square":
+                continue
+            mean = (abs(fits[a][value]) + abs(fits[b][value])) / 2
+            asymmetry[name][value] = (
+                (fits[a][value] - fits[b][value]) / mean if mean else 0.0
+            )
+    return asymmetry
+
+
+def format_fits(fits, asymmetry):
+    """
+    :param fits: the results of calc_fit_all
+    :param asymmetry: the results of fit_asymmetry
+    :returns: the fits and their asymmetry as a plain-text table
+    """
+    names = list(next(iter(fits.values())))
+    lines = ["%-26s " % "subset" + " ".join("%10s" % n for n in names)]
+    for subset, fit in fits.items():
+        lines.append("%-26s " % subset + " ".join("%10.4g" % fit[n] for n in names))
+
+    lines.append("")
+    lines.append("%-26s " % "asymmetry" + " ".join("%10s" % n for n in names))
+    for name, values in asymmetry.items():
+        lines.append(
+            "%-26s " % name
+            + " ".join(
+                "%9.1f%%" % (values[n] * 100) if n in values else "%10s" % ""
+                for n in names
+            )
+        )
+    return "\n".join(lines)
+
+
+# Replaying the fitted models: each model is integrated open-loop from the
+# start of every piece of data, driven by the recorded voltage, and compared
+# with the measured motion.  Friction and gravity are evaluated at the
+# measured velocity and position, so between samples the model is linear and
+# advances exactly with the zero-order hold discretization.  Every sample is
+# then an affine map of the previous state, and the states of all pieces and
+# subsets are found at once with a prefix scan over these maps.
+
+# Error metrics of each replayed piece: the RMS and maximum velocity and
+# position errors, and the RMS velocity error relative to the RMS velocity
+REPLAY_METRICS = ("vel_rms", "vel_max", "pos_rms", "pos_max", "rel_error")
+
+
+def _affine_scan(a, b, length):
+    """
+    Evaluates x[k] = a[k] x[k - 1] + b[k] along the last axis, where the
+    recurrence restarts (a[k] = 0) at least every length samples.
+    """
+    a, b = a.copy(), b.copy()
+    shift = 1
+    while shift < length:
+        # Compose each map with the one shift samples before it
+        b[..., shift:] += a[..., shift:] * b[..., :-shift]
+        a[..., shift:] *= a[..., :-shift]
+        shift *= 2
+    return b
+
+
+def replay_fits(prepared, test, fits):
+    """
+    Replays the fitted model of every subset against each piece of data it
+    was fitted to.
+
+    :param prepared: PreparedData from prepare_data
+    :param test: the Tests value of the mechanism
+    :param fits: the results of calc_fit_all
+    :returns: dict of subset name -> dict of piece name -> dict of metric
+              name (see REPLAY_METRICS) -> value
+    """
+    test = Tests(test)
+    subsets = list(fits)
+
+    def param(name):
+        return np.array([[fits[subset].get(name, 0.0)] for subset in subsets])
+
+    ks, kv, ka, kg, kcos = (param(n) for n in ("ks", "kv", "ka", "kg", "kcos"))
+
+    metrics = {}
+    for buffer, names in zip((prepared.quasi, prepared.step), get_pieces(test)):
+        starts = np.array([prepared.bounds[name][0] for name in names])
+        length = max(
+            prepared.bounds[name][1] - start for name, start in zip(names, starts)
+        )
+
+        pos = buffer[PREPARED_POS_COL]
+        vel = buffer[PREPARED_VEL_COL]
+
+        # Sample k is reached from sample k - 1 with the inputs of k - 1
+        dt = np.diff(buffer[PREPARED_TM_COL], prepend=buffer[PREPARED_TM_COL, 0])
+        u = buffer[PREPARED_V_COL] - ks * np.sign(vel) - kg
+        if test == Tests.ARM:
+            u = u - kcos * buffer[PREPARED_COS_COL]
+        u = np.roll(u, 1, axis=-1)
+
+        with np.errstate(all="ignore"):
+            a01, a11, b0, b1 = lqr.position_coefficients(kv, ka, dt)
+
+            # Each piece starts from its measured state
+            a = a11
+            a[:, starts] = 0
+            b = b1 * u
+            b[:, starts] = vel[starts]
+            replayed_vel = _affine_scan(a, b, length)
+
+            a = np.ones_like(a)
+            a[:, starts] = 0
+            b = a01 * np.roll(replayed_vel, 1, axis=-1) + b0 * u
+            b[:, starts] = pos[starts]
+            replayed_pos = _affine_scan(a, b, length)
+
+            vel_error = replayed_vel - vel
+            pos_error = replayed_pos - pos
+            counts = np.diff(np.append(starts, len(vel)))
+            piece_metrics = {
+                "vel_rms": np.sqrt(
+                    np.add.reduceat(np.square(vel_error), starts, axis=-1) / counts
+                ),
+                "vel_max": np.maximum.reduceat(np.abs(vel_error), starts, axis=-1),
+                "pos_rms": np.sqrt(
+                    np.add.reduceat(np.square(pos_error), starts, axis=-1) / counts
+                ),
+                "pos_max": np.maximum.reduceat(np.abs(pos_error), starts, axis=-1),
+            }
+            piece_metrics["rel_error"] = piece_metrics["vel_rms"] / np.sqrt(
+                np.add.reduceat(np.square(vel), starts) / counts
+            )
+
+        for i, subset in enumerate(subsets):
+            for j, name in enumerate(names):
+                metrics.setdefault(subset, {})[name] = {
+                    n: float(piece_metrics[n][i, j]) for n in REPLAY_METRICS
+                }
+
+    # Only report the pieces each subset was fitted to
+    return {
+        subset: {
+            piece: metrics[subset][piece] for piece in sum(prepared.subsets[subset], ())
+        }
+        for subset in subsets
+    }
+
+
+def worst_replay(replay):
+    """
+    :param replay: the results of replay_fits for a single subset
+    :returns: dict of metric name -> its largest value over the pieces, or
+              NaN if the model couldn't be replayed on some piece
+    """
+    return {
+        n: float(np.max([piece[n] for piece in replay.values()]))
+        for n in REPLAY_METRICS
+    }
+
+
+def format_replay(replays):
+    """
+    :param replays: the results of replay_fits
+    :returns: the errors of every subset and piece as a plain-text table
+    """
+    lines = [
+        "%-26s %6s " % ("subset", "piece")
+        + " ".join("%10s" % n for n in REPLAY_METRICS)
+    ]
+    for subset, replay in replays.items():
+        for piece, values in replay.items():
+            lines.append(
+                "%-26s %6s " % (subset, piece)
+                + " ".join("%10.4g" % values[n] for n in REPLAY_METRICS)
+            )
+    return "\n".join(lines)
+
+
+# The gains only depend on a handful of numbers, and are recomputed every
+# time any setting of the analyzer changes, so they are memoized.
+
+
+@functools.lru_cache(maxsize=1024)
+def calc_gains_pos(kv, ka, qp, qv, effort, period, position_delay):
+    # If acceleration requires no effort, velocity becomes an input for position
+    # control. We choose an appropriate model in this case to avoid numerical
+    # instabilities in LQR.
+    if ka > 1e-7:
+        # dx/dt = [[0, 1], [0, -kv/ka]] x + [[0], [1/ka]] u
+        A, B = lqr.discretize_position(kv, ka, period)
+
+        q = [qp, qv]  # units and units/s acceptable errors
+        r = [effort]  # V acceptable actuation effort
+    else:
+        # dx/dt = u
+        A = np.array([[1.0]])
+        B = np.array([[period]])
+
+        q = [qp]  # units acceptable error
+        r = [qv]  # units/s acceptable error
+
+    # Assign Q and R matrices according to Bryson's rule [1]. The elements
+    # of q and r are tunable by the user.
+    #
+    # [1] 'Bryson's rule' in
+    #     https://file.tavsys.net/control/state-space-guide.pdf
+    Q = np.diag(1.0 / np.square(q))
+    R = np.diag(1.0 / np.square(r))
+    K = lqr.lqr(A, B, Q, R)
+
+    if position_delay > 0:
+        # This corrects the gain to compensate for measurement delay, which
+        # can be quite large as a result of filtering for some motor
+        # controller and sensor combinations. Note that this will result in
+        # an overly conservative (i.e. non-optimal) gain, because we need to
+        # have a time-varying control gain to give the system an initial kick
+        # in the right direction. The state will converge to zero and the
+        # controller gain will converge to the steady-state one the tool outputs.
+        #
+        # See E.4.2 in
+        #   https://file.tavsys.net/control/controls-engineering-in-frc.pdf
+        delay_in_seconds = position_delay / 1000  # ms -> s
+        K = K @ np.linalg.matrix_power(A - B @ K, round(delay_in_seconds / period))
+
+    # With the alternate model, `kp = kv * K[0, 0]` is used because the gain
+    # produced by LQR is for velocity. We can use the feedforward equation
+    # `u = kv * v` to convert velocity to voltage. `kd = 0` because velocity
+    # was an input; we don't need feedback control to command it.
+    if ka > 1e-7:
+        kp = K[0, 0]
+        kd = K[0, 1]
+    else:
+        kp = kv * K[0, 0]
+        kd = 0
+
+    return kp, kd
+
+
+@functools.lru_cache(maxsize=1024)
+def calc_gains_vel(kv, ka, qv, effort, period, velocity_delay):
+    # If acceleration for velocity control requires no effort, the feedback
+    # control gains approach zero. We special-case it here because numerical
+    # instabilities arise in LQR otherwise.
+    if ka < 1e-7:
+        return 0, 0
+
+    # dv/dt = -kv/ka v + 1/ka u
+    A, B = lqr.discretize_velocity(kv, ka, period)
+
+    # Assign Q and R matrices according to Bryson's rule [1]. The elements
+    # of q and r are tunable by the user.
+    #
+    # [1] 'Bryson's rule' in
+    #     https://file.tavsys.net/control/state-space-guide.pdf
+    q = [qv]  # units/s acceptable error
+    r = [effort]  # V acceptable actuation effort
+    Q = np.diag(1.0 / np.square(q))
+    R = np.diag(1.0 / np.square(r))
+    K = lqr.lqr(A, B, Q, R)
+
+    if velocity_delay > 0:
+        # This corrects the gain to compensate for measurement delay, which
+        # can be quite large as a result of filtering for some motor
+        # controller and sensor combinations. Note that this will result in
+        # an overly conservative (i.e. non-optimal) gain, because we need to
+        # have a time-varying control gain to give the system an initial kick
+        # in the right direction. The state will converge to zero and the
+        # controller gain will converge to the steady-state one the tool outputs.
+        #
+        # See E.4.2 in
+        #   https://file.tavsys.net/control/controls-engineering-in-frc.pdf
+        delay_in_seconds = velocity_delay / 1000  # ms -> s
+        K = K @ np.linalg.matrix_power(A - B @ K, round(delay_in_seconds / period))
+
+    kp = K[0, 0]
+    kd = 0
+
+    return kp, kd
+
+
+def calc_gains(
+    kv,
+    ka,
+    loop_type="Velocity",
+    qp=1,
+    qv=1.5,
+    max_effort=7,
+    period=0.02,
+    measurement_delay=0,
+    max_controller_output=12,
+    time_normalized=True,
+    follower_period=None,
+):
+    """
+    Computes the feedback gains of a position or velocity loop, scaled to the
+    output range of the controller.
+
+    :param loop_type: "Position" or "Velocity"
+    :param qp: maximum acceptable position error
+    :param qv: maximum acceptable velocity error
+    :param max_effort: maximum acceptable control effort (V)
+    :param period: period of the control loop (s)
+    :param measurement_delay: measurement delay of the sensor (ms)
+    :param max_controller_output: output of the controller corresponding to
+                                  12V
+    :param time_normalized: False if the controller's kD is per loop period
+                            instead of per second
+    :param follower_period: period of the follower's control loop, if the
+                            gains are used on a follower controller
+    :returns: (kp, kd)
+    """
+    gain_period = period if follower_period is None else follower_period
+
+    if loop_type == "Position":
+        kp, kd = calc_gains_pos(
+            kv, ka, qp, qv, max_effort, gain_period, measurement_delay
+        )
+    else:
+        kp, kd = calc_gains_vel(kv, ka, qv, max_effort, gain_period, measurement_delay)
+
+    # Scale gains to output
+    kp = kp / 12 * max_controller_output
+    kd = kd / 12 * max_controller_output
+
+    # Rescale kD if not time-normalized
+    if not time_normalized:
+        kd = kd / period
+
+    return kp, kd
+
+
+def sweep_gains(
+    kv,
+    ka,
+    loop_type="Velocity",
+    qp=1,
+    qv=1.5,
+    max_effort=7,
+    period=0.02,
+    measurement_delay=0,
+    max_controller_output=12,
+    time_normalized=True,
+    follower_period=None,
+):
+    """
+    Computes the feedback gains for many settings at once.  The parameters are
+    those of calc_gains, but qp, qv, max_effort, period and measurement_delay
+    may be arrays, which are broadcast against each other (e.g. qp[:, None]
+    and qv[None, :] give the gains over a grid of both).  All the systems are
+    solved together, so this is much faster than calling calc_gains for each
+    combination.
+
+    :returns: dict with "kp" and "kd" arrays of the broadcast shape, as
+              returned by calc_gains, and "poles", the discrete closed-loop
+              poles of the model with those gains (one per state, along an
+              extra last axis).  The poles don't include the measurement
+              delay itself.
+    """
+    qp, qv, effort, period, delay = np.broadcast_arrays(
+        *(
+            np.asarray(v, dtype=float)
+            for v in (qp, qv, max_effort, period, measurement_delay)
+        )
+    )
+    shape = period.shape
+    gain_period = period if follower_period is None else np.full(shape, follower_period)
+
+    def diagonal(*elements):
+        # Stack of diagonal matrices, with Bryson's rule applied as in
+        # calc_gains_pos and calc_gains_vel
+        m = np.zeros(shape + (len(elements), len(elements)))
+        for i, e in enumerate(elements):
+            m[..., i, i] = 1.0 / np.square(e)
+        return m
+
+    # The same models as calc_gains_pos and calc_gains_vel
+    if loop_type == "Position" and ka > 1e-7:
+        A, B = lqr.discretize_position(kv, ka, gain_period)
+        Q, R = diagonal(qp, qv), diagonal(effort)
+    elif loop_type == "Position":
+        A = np.ones(shape + (1, 1))
+        B = gain_period[..., np.newaxis, np.newaxis]
+        Q, R = diagonal(qp), diagonal(qv)
+    elif ka >= 1e-7:
+        A, B = lqr.discretize_velocity(kv, ka, gain_period)
+        Q, R = diagonal(qv), diagonal(effort)
+    else:
+        # The gains are zero, and the velocity follows the voltage at once
+        zeros = np.zeros(shape)
+        return {"kp": zeros, "kd": zeros, "poles": zeros[..., np.newaxis]}
+
+    K = lqr.lqr(A, B, Q, R)
+
+    # Delay compensation, as in calc_gains_pos; settings with the same number
+    # of delayed periods are corrected together
+    steps = np.rint(delay / 1000 / gain_period).astype(int)
+    for n in np.unique(steps[delay > 0]):
+        idx = (delay > 0) & (steps == n)
+        K[idx] = K[idx] @ np.linalg.matrix_power(A[idx] - B[idx] @ K[idx], n)
+
+    poles = np.linalg.eigvals(A - B @ K)
+
+    if loop_type == "Position" and ka > 1e-7:
+        kp, kd = K[..., 0, 0], K[..., 0, 1]
+    elif loop_type == "Position":
+        kp, kd = kv * K[..., 0, 0], np.zeros(shape)
+    else:
+        kp, kd = K[..., 0, 0], np.zeros(shape)
+
+    # Scale gains to output, as in calc_gains
+    kp = kp / 12 * max_controller_output
+    kd = kd / 12 * max_controller_output
+    if not time_normalized:
+        kd = kd / period
+
+    return {"kp": kp, "kd": kd, "poles": poles}
+
+
+def format_gain_sweep(results, settings, metrics=None):
+    """
+    :param results: the results of sweep_gains
+    :param settings: dict of the name of each swept setting -> its values,
+                     broadcastable to the shape of the results
+    :param metrics: optional dict of further columns -> their values, e.g.
+                    the step_metrics of a simulation of the gains
+    :returns: the results as a plain-text table, one row per combination,
+              with the largest magnitude of the closed-loop poles
+    """
+    shape = results["kp"].shape
+    columns = {n: np.broadcast_to(v, shape) for n, v in settings.items()}
+    columns["kP"] = results["kp"]
+    columns["kD"] = results["kd"]
+    columns["max |pole|"] = np.max(np.abs(results["poles"]), axis=-1)
+    for n, v in (metrics or {}).items():
+        columns[n] = np.broadcast_to(v, shape)
+
+    widths = [max(10, len(n)) for n in columns]
+    lines = [" ".join("%*s" % (w, n) for w, n in zip(widths, columns))]
+    for i in np.ndindex(shape):
+        lines.append(
+            " ".join("%*.4g" % (w, v[i]) for w, v in zip(widths, columns.values()))
+        )
+    return "\n".join(lines)
+
+
+def convert_gains(
+    kp, kd, controller_type, loop_type, units, units_per_rot, encoder_epr, gearing
+):
+    """
+    Converts gains from calc_gains to the native units of a smart motor
+    controller.
+
+    :param controller_type: "Talon" or "Spark"; other controllers use the
+                            gains unchanged
+    :param units: the Units value the gains were computed in
+    :param units_per_rot: units per rotation, for non-rotational units
+    :returns: (kp, kd)
+    """
+    # Get correct conversion factor for rotations
+    if is_rotation(units):
+        rotation = (1 * Units.ROTATIONS.unit).to(Units(units).unit).magnitude
+    else:
+        rotation = units_per_rot
+
+    if controller_type == "Talon":
+        kp = kp * rotation / (encoder_epr * gearing)
+        kd = kd * rotation / (encoder_epr * gearing)
+        if loop_type == "Velocity":
+            kp = kp * 10
+    if controller_type == "Spark":
+        kp = kp / gearing
+        kd = kd / gearing
+        if loop_type == "Velocity":
+            kp = kp / 60
+
+    return kp, kd
+
+
+def calc_track_width(table, units, data_units, data_units_per_rot, units_per_rot):
+    """
+    Computes the effective track width of a drivetrain from the track-width
+    test.
+
+    :param table: raw track-width test data, indexed by the *_COL constants
+    :param units: the Units value of the result
+    :param data_units: the Units value the data was recorded in
+    :param data_units_per_rot: units per rotation the data was recorded with
+    :param units_per_rot: units per rotation of the result
+    :returns: the track width, or None if units is rotational
+    """
+    # Doesn't run calculations if the units are rotational
+    if is_rotation(units):
+        return None
+
+    # handle the case where data recorded only rotational
+    if is_rotation(data_units):
+        # Convert to Rotations
+        units_per_rotation = (
+            (data_units_per_rot * Units(data_units).unit)
+            .to(Units.ROTATIONS.unit)
+            .magnitude
+        )
+
+        # Convert to distance
+        conversion_factor = round(units_per_rotation * units_per_rot, 3)
+    else:
+        conversion_factor = units_per_rot
+
+    # Note that this assumes the gyro angle is not modded (i.e. on [0, +infinity)),
+    # and that a positive angle travels in the counter-clockwise direction
+
+    d_left = (
+        table[R_ENCODER_P_COL][-1] - table[R_ENCODER_P_COL][0]
+    ) * conversion_factor
+    d_right = (
+        table[L_ENCODER_P_COL][-1] - table[L_ENCODER_P_COL][0]
+    ) * conversion_factor
+    d_angle = table[GYRO_ANGLE_COL][-1] - table[GYRO_ANGLE_COL][0]
+
+    if d_angle == 0:
+        raise AnalysisError(
+            "Change in gyro angle was 0... Is your gyro set up correctly?"
+        )
+
+    # The below comes from solving ω=(vr−vl)/2r for 2r
+    # Absolute values used to ensure the calculated value is always positive
+    # and to add robustness to sensor inversion
+    diameter = (abs(d_left) + abs(d_right)) / abs(d_angle)
+
+    return diameter
@@ -0,0 +1,259 @@
+# Batch analysis of many run files at once.  Every file is analyzed with the
+# same settings in a pool of worker processes, and the fits and gains of each
+# subset are written to a single CSV table, one row per file and subset.
+#
+# Each fit is also replayed against the runs it was fitted to (see
+# analysis.replay_fits), and the worst errors over those runs are reported, so
+# bad fits can be found (and optionally rejected) without looking at plots.
+
+import csv
+import glob
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from frc_characterization.logger_analyzer import analysis, data_file
+from frc_characterization.constants import Tests
+
+logger = logging.getLogger("logger")
+log_format = "%(asctime)s:%(msecs)03d %(levelname)-8s: %(name)-20s: %(message)s"
+
+# Columns of the output table
+FIELDS = (
+    "file",
+    "test",
+    "units",
+    "subset",
+    "ks",
+    "kv",
+    "ka",
+    "kg",
+    "kcos",
+    "r_square",
+    "track_width",
+    "kp",
+    "kd",
+    "replay_vel_rms",
+    "replay_vel_max",
+    "replay_pos_rms",
+    "replay_pos_max",
+    "replay_rel_error",
+    "rejected",
+    "error",
+)
+
+RUN_FILE_PATTERNS = ("*" + data_file.BINARY_EXTENSION, "*" + data_file.JSON_EXTENSION)
+
+
+def find_run_files(paths):
+    """
+    :param paths: run files, directories containing run files, or glob
+                  patterns
+    :returns: sorted list of the run files found
+    """
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in RUN_FILE_PATTERNS:
+                files.update(glob.glob(os.path.join(path, pattern)))
+        elif os.path.isfile(path):
+            files.add(path)
+        else:
+            files.update(f for f in glob.glob(path) if os.path.isfile(f))
+    return sorted(files)
+
+
+def analyze_file(
+    path,
+    window=8,
+    motion_threshold=0.2,
+    test=None,
+    gains=None,
+    max_replay_error=None,
+):
+    """
+    Analyzes a single run file.  Errors are reported in the "error" column of
+    the returned rows instead of being raised, so one bad file doesn't stop a
+    batch.
+
+    :param path: run file to analyze
+    :param window: smoothing window for the acceleration
+    :param motion_threshold: minimum velocity of the quasistatic data
+    :param test: if given, files recorded for other mechanisms are rejected
+    :param gains: keyword arguments for analysis.calc_gains
+    :param max_replay_error: if given, fits whose replay_rel_error is larger
+                             (see analysis.replay_fits) are marked in the
+                             "rejected" column
+    :returns: list of rows (dicts with FIELDS as keys), one per subset
+    """
+    try:
+        data = data_file.read(path, mmap_mode="r")
+        for k in analysis.JSON_DATA_KEYS:
+            if k not in data or data[k].ndim != 2:
+                raise ValueError("Run %r has no data" % k)
+
+        data_test = Tests(data["test"])
+        if test is not None and data_test != Tests(test):
+            raise ValueError(
+                "Recorded with the %s test, not %s"
+                % (data_test.value, Tests(test).value)
+            )
+
+        # Results are in the units the data was recorded in, as in the GUI
+        units = data["units"]
+        units_per_rot = analysis.convert_units_per_rot(
+            units, units, data["unitsPerRotation"]
+        )
+
+        prepared = analysis.prepare_data(
+            data, data_test, window, motion_threshold, units, units_per_rot
+        )
+    except Exception as e:
+        return [{"file": path, "error": str(e) or repr(e)}]
+
+    track_width = None
+    track_width_error = None
+    if data_test == Tests.DRIVETRAIN and "track-width" in data:
+        try:
+            track_width = analysis.calc_track_width(
+                data["track-width"],
+                units,
+                units,
+                data["unitsPerRotation"],
+                units_per_rot,
+            )
+        except Exception as e:
+            track_width_error = str(e) or repr(e)
+
+    def base_row(subset, error):
+        return {
+            "file": path,
+            "test": data_test.value,
+            "units": units,
+            "subset": subset,
+            "track_width": track_width,
+            "error": error,
+        }
+
+    try:
+        fits = analysis.calc_fit_all(prepared, data_test)
+    except Exception as e:
+        error = str(e) or repr(e)
+        return [base_row(subset, error) for subset in prepared.subsets]
+
+    try:
+        replays = analysis.replay_fits(prepared, data_test, fits)
+        replays_error = None
+    except Exception as e:
+        replays = None
+        replays_error = str(e) or repr(e)
+
+    rows = []
+    for subset, fit in fits.items():
+        row = base_row(subset, track_width_error)
+        row.update(fit)
+
+        replay_error = replays_error
+        if replay_error is None:
+            try:
+                replay = analysis.worst_replay(replays[subset])
+            except Exception as e:
+                replay_error = str(e) or repr(e)
+
+        if replay_error is not None:
+            row["error"] = "; ".join(
+                filter(None, (row["error"], "Replay failed: " + replay_error))
+            )
+            # A fit that couldn't be checked doesn't pass the check
+            if max_replay_error is not None:
+                row["rejected"] = "Replay failed"
+        else:
+            row.update(("replay_" + name, value) for name, value in replay.items())
+            # NaN (a model that can't be replayed) is rejected too
+            if max_replay_error is not None and not (
+                replay["rel_error"] <= max_replay_error
+            ):
+                row["rejected"] = "Replay error %.3g is above %.3g" % (
+                    replay["rel_error"],
+                    max_replay_error,
+                )
+
+        try:
+            row["kp"], row["kd"] = analysis.calc_gains(
+                row["kv"], row["ka"], **(gains or {})
+            )
+        except Exception as e:
+            row["error"] = "; ".join(filter(None, (row["error"], str(e) or repr(e))))
+        rows.append(row)
+
+    return rows
+
+
+def _analyze_file(args):
+    path, kwargs = args
+    return analyze_file(path, **kwargs)
+
+
+def run_batch(paths, output, jobs=None, **kwargs):
+    """
+    Analyzes all run files found in paths in parallel and writes the results
+    to a CSV file.
+
+    :param paths: run files, directories or glob patterns; see find_run_files
+    :param output: path of the CSV file to write
+    :param jobs: number of worker processes, defaults to the number of CPUs
+    :param kwargs: passed to analyze_file
+    :returns: the number of files analyzed
+    """
+    files = find_run_files(paths)
+    if not files:
+        logger.warning("No run files found in %s", ", ".join(paths))
+        return 0
+
+    logger.info("Analyzing %d run files", len(files))
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor, open(
+        output, "w", newline=""
+    ) as fp:
+        writer = csv.DictWriter(fp, fieldnames=FIELDS)
+        writer.writeheader()
+
+        # Results come back in file order, so the table is deterministic
+        work = [(path, kwargs) for path in files]
+        chunksize = max(1, len(files) // (4 * (jobs or os.cpu_count() or 1)))
+        for rows in executor.map(_analyze_file, work, chunksize=chunksize):
+            for error in sorted({row["error"] for row in rows if row.get("error")}):
+                logger.warning("%s: %s", rows[0]["file"], error)
+            for row in rows:
+                if row.get("rejected"):
+                    logger.warning(
+                        "%s: rejected %s fit: %s",
+                        row["file"],
+                        row["subset"],
+                        row["rejected"],
+                    )
+            writer.writerows(rows)
+
+    logger.info("Wrote results to %s", output)
+    return len(files)
+
+
+def main(
+    paths,
+    output,
+    jobs=None,
+    test=None,
+    window=8,
+    motion_threshold=0.2,
+    max_replay_error=None,
+):
+    logging.basicConfig(level=logging.INFO, format=log_format)
+    run_batch(
+        paths,
+        output,
+        jobs=jobs,
+        test=test,
+        window=window,
+        motion_threshold=motion_threshold,
+        max_replay_error=max_replay_error,
+    )
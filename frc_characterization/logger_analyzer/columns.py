@@ -0,0 +1,33 @@
+# Layout of the data recorded by the data logger and of the data prepared for
+# analysis.  This module has no dependencies so that the data logger can use
+# it without loading any of the analysis code.
+
+# These are the indices of data stored in the data file
+TIME_COL = 0
+BATTERY_COL = 1
+AUTOSPEED_COL = 2
+L_VOLTS_COL = 3
+R_VOLTS_COL = 4
+L_ENCODER_P_COL = 5
+R_ENCODER_P_COL = 6
+L_ENCODER_V_COL = 7
+R_ENCODER_V_COL = 8
+GYRO_ANGLE_COL = 9
+
+NUM_COLUMNS = GYRO_ANGLE_COL + 1
+
+# The are the indices of data returned from prepare_data function
+PREPARED_TM_COL = 0
+PREPARED_V_COL = 1
+PREPARED_POS_COL = 2
+PREPARED_VEL_COL = 3
+PREPARED_ACC_COL = 4
+PREPARED_COS_COL = 5
+
+PREPARED_MAX_COL = PREPARED_ACC_COL
+
+# The (volts, position, velocity) columns of each side of the mechanism
+LEFT_COLS = (L_VOLTS_COL, L_ENCODER_P_COL, L_ENCODER_V_COL)
+RIGHT_COLS = (R_VOLTS_COL, R_ENCODER_P_COL, R_ENCODER_V_COL)
+
+JSON_DATA_KEYS = ["slow-forward", "slow-backward", "fast-forward", "fast-backward"]
@@ -2,8 +2,7 @@
 # provided for both feedforward and feedback analysis, as well as diagnostic
 # plotting.
 
-import copy
-import json
+import functools
 import logging
 import math
 import os
@@ -11,54 +10,70 @@ import tkinter
 from tkinter import *
 from tkinter import filedialog
 from tkinter import messagebox
+from tkinter.scrolledtext import ScrolledText
 
-import control as cnt
-import frccontrol as frccnt
-import matplotlib
-import pint
-
-# This fixes a crash on macOS Mojave by using the TkAgg backend
-# https://stackoverflow.com/a/34109240
-matplotlib.use("TkAgg")
-from matplotlib import pyplot as plt
 import numpy as np
-import statsmodels.api as sm
-from frc_characterization.newproject import Tests, Units
+from frc_characterization.constants import Tests, Units
+from frc_characterization.logger_analyzer import (
+    analysis,
+    data_file,
+    downsample,
+    plot_cache,
+    simulation,
+)
+from frc_characterization.logger_analyzer.analysis import AnalysisError
+from frc_characterization.logger_analyzer.prepared_cache import (
+    PreparedCache,
+    data_digest,
+)
+from frc_characterization.logger_analyzer.columns import (
+    TIME_COL,
+    BATTERY_COL,
+    AUTOSPEED_COL,
+    L_VOLTS_COL,
+    R_VOLTS_COL,
+    L_ENCODER_P_COL,
+    R_ENCODER_P_COL,
+    L_ENCODER_V_COL,
+    R_ENCODER_V_COL,
+    GYRO_ANGLE_COL,
+    PREPARED_TM_COL,
+    PREPARED_V_COL,
+    PREPARED_POS_COL,
+    PREPARED_VEL_COL,
+    PREPARED_ACC_COL,
+    PREPARED_COS_COL,
+    JSON_DATA_KEYS,
+)
 from frc_characterization.utils import FloatEntry, IntEntry
-from mpl_toolkits.mplot3d import Axes3D
 
 logger = logging.getLogger("logger")
 log_format = "%(asctime)s:%(msecs)03d %(levelname)-8s: %(name)-20s: %(message)s"
 
 logging.basicConfig(level=logging.INFO, format=log_format)
 
-# These are the indices of data stored in the json file
-TIME_COL = 0
-BATTERY_COL = 1
-AUTOSPEED_COL = 2
-L_VOLTS_COL = 3
-R_VOLTS_COL = 4
-L_ENCODER_P_COL = 5
-R_ENCODER_P_COL = 6
-L_ENCODER_V_COL = 7
-R_ENCODER_V_COL = 8
-GYRO_ANGLE_COL = 9
 
-# The are the indices of data returned from prepare_data function
-PREPARED_TM_COL = 0
-PREPARED_V_COL = 1
-PREPARED_POS_COL = 2
-PREPARED_VEL_COL = 3
-PREPARED_ACC_COL = 4
-PREPARED_COS_COL = 5
+@functools.lru_cache(maxsize=None)
+def pyplot():
+    """
+    Imports pyplot the first time a plot is shown; matplotlib takes a while to
+    import and isn't needed until then.
+    """
+    import matplotlib
+
+    # This fixes a crash on macOS Mojave by using the TkAgg backend
+    # https://stackoverflow.com/a/34109240
+    matplotlib.use("TkAgg")
+    from matplotlib import pyplot as plt
 
-PREPARED_MAX_COL = PREPARED_ACC_COL
+    # Registers the 3d projection
+    from mpl_toolkits.mplot3d import Axes3D
 
-JSON_DATA_KEYS = ["slow-forward", "slow-backward", "fast-forward", "fast-backward"]
+    return plt
 
 
 class Analyzer:
-    def __init__(self, dir):
+    def __init__(self, dir, cache_dir=None):
         self.mainGUI = tkinter.Tk()
 
         self.project_path = StringVar(self.mainGUI)
@@ -70,6 +85,17 @@ class Analyzer:
         self.motion_threshold = DoubleVar(self.mainGUI)
         self.motion_threshold.set(0.2)
 
+        # Most points drawn by each diagnostic plot, or 0 to draw every sample
+        self.plot_points = IntVar(self.mainGUI)
+        self.plot_points.set(5000)
+
+        # Values tried by the parameter sweep
+        self.sweep_windows = StringVar(self.mainGUI)
+        self.sweep_windows.set("4, 6, 8, 10, 12, 16")
+
+        self.sweep_thresholds = StringVar(self.mainGUI)
+        self.sweep_thresholds.set("0.05, 0.1, 0.2, 0.3, 0.5")
+
         self.subset = StringVar(self.mainGUI)
 
         self.units = StringVar(self.mainGUI)
@@ -80,6 +106,14 @@ class Analyzer:
 
         self.stored_data = None
 
+        # Figures of the plots, which are updated in place when plotted again
+        self.figures = plot_cache.FigureCache()
+
+        # Hash of stored_data, computed when it is first prepared
+        self.stored_digest = None
+
+        self.prepared_cache = PreparedCache(directory=cache_dir)
+
         self.prepared_data = None
 
         self.ks = DoubleVar(self.mainGUI)
@@ -133,6 +167,26 @@ class Analyzer:
         self.kp = DoubleVar(self.mainGUI)
         self.kd = DoubleVar(self.mainGUI)
 
+        # Settings and values tried by the gain sweep
+        self.gain_sweep_x = StringVar(self.mainGUI)
+        self.gain_sweep_x.set("Velocity Error")
+
+        self.gain_sweep_x_values = StringVar(self.mainGUI)
+        self.gain_sweep_x_values.set("0.5, 1, 1.5, 2, 3")
+
+        self.gain_sweep_y = StringVar(self.mainGUI)
+        self.gain_sweep_y.set("Control Effort")
+
+        self.gain_sweep_y_values = StringVar(self.mainGUI)
+        self.gain_sweep_y_values.set("3, 5, 7, 9, 12")
+
+        # Step response the gains are simulated with
+        self.sim_step_size = DoubleVar(self.mainGUI)
+        self.sim_step_size.set(1)
+
+        self.sim_duration = DoubleVar(self.mainGUI)
+        self.sim_duration.set(2)
+
         self.test = StringVar(self.mainGUI)
         self.kg = DoubleVar(self.mainGUI)
         self.kcos = DoubleVar(self.mainGUI)
@@ -145,29 +199,40 @@ class Analyzer:
 
     def configure_gui(self):
         def getFile():
-            dataFile = tkinter.filedialog.askopenfile(
+            dataFile = tkinter.filedialog.askopenfilename(
                 parent=self.mainGUI,
-                mode="rb",
-                title="Choose the data file (.JSON)",
+                title="Choose the data file",
                 initialdir=self.project_path.get(),
+                filetypes=(
+                    ("Characterization data", "*" + data_file.BINARY_EXTENSION),
+                    ("JSON", "*" + data_file.JSON_EXTENSION),
+                    ("All files", "*"),
+                ),
             )
+            if not dataFile:
+                return
             fileEntry.configure(state="normal")
             fileEntry.delete(0, END)
-            fileEntry.insert(0, dataFile.name)
+            fileEntry.insert(0, dataFile)
             fileEntry.configure(state="readonly")
             try:
-                data = json.load(dataFile)
+                # Runs are memory-mapped read-only; columns are only paged in
+                # from disk once the analysis touches them
+                data = data_file.read(dataFile, mmap_mode="r")
 
                 try:
-                    # Transform the data into a numpy array to make it easier to use
-                    # -> transpose it so we can deal with it in columns
                     for k in JSON_DATA_KEYS:
-                        data[k] = np.array(data[k]).transpose()
+                        if data[k].ndim != 2:
+                            raise ValueError("Run %r has no data" % k)
 
                     self.stored_data = data
+                    self.stored_digest = None
+                    # The plots of the previous file are out of date
+                    self.figures.close_all()
                     logger.info("Received Data!")
 
                     analyzeButton.configure(state="normal")
+                    sweepButton.configure(state="normal")
                     self.units.set(data["units"])
                     self.test.set(data["test"])
                     self.units_per_rot.set(float(data["unitsPerRotation"]))
@@ -182,7 +247,7 @@ class Analyzer:
                 except Exception as e:
                     messagebox.showerror(
                         "Error!",
-                        "The structure of the data JSON was not recognized.\n"
+                        "The structure of the data file was not recognized.\n"
                         + "Details\n"
                         + repr(e),
                     )
@@ -190,7 +255,7 @@ class Analyzer:
             except Exception as e:
                 messagebox.showerror(
                     "Error!",
-                    "The JSON file could not be loaded.\n" + "Details:\n" + repr(e),
+                    "The data file could not be loaded.\n" + "Details:\n" + repr(e),
                     parent=self.mainGUI,
                 )
                 return
@@ -207,7 +272,7 @@ class Analyzer:
                 self.stored_data, window=self.window_size.get()
             )
 
-            if not self.prepared_data["Valid"]:
+            if self.prepared_data is None:
                 return
 
             test_runners[Tests(self.test.get())]()
@@ -215,13 +280,27 @@ class Analyzer:
 
             calcGains()
 
+            # Update the diagnostic plots of the subset that are already open
+            subset = self.subset.get()
+            for title, plot in (
+                (" Time-Domain Plots", plotTimeDomain),
+                (" Voltage-Domain Plots", plotVoltageDomain),
+                (" 3D Vel-Accel Plane Plot", plot3D),
+            ):
+                if self.figures.get(subset + title) is not None:
+                    plot()
+
             timePlotsButton.configure(state="normal")
             voltPlotsButton.configure(state="normal")
             fancyPlotButton.configure(state="normal")
+            compareButton.configure(state="normal")
+            replayButton.configure(state="normal")
             calcGainsButton.configure(state="normal")
+            gainSweepButton.configure(state="normal")
+            simulateButton.configure(state="normal")
 
         def runAnalysisDrive():
-            ks, kv, ka, rsquare = self.calcFit(
+            ks, kv, ka, rsquare = analysis.calc_fit(
                 *self.prepared_data[self.subset.get()], self.test.get()
             )
 
@@ -236,7 +315,7 @@ class Analyzer:
                 self.track_width.set("N/A")
 
         def runAnalysisElevator():
-            kg, kfr, kv, ka, rsquare = self.calcFit(
+            kg, kfr, kv, ka, rsquare = analysis.calc_fit(
                 *self.prepared_data[self.subset.get()], self.test.get()
             )
 
@@ -247,7 +326,7 @@ class Analyzer:
             self.r_square.set(float("%.3g" % rsquare))
 
         def runAnalysisArm():
-            ks, kv, ka, kcos, rsquare = self.calcFit(
+            ks, kv, ka, kcos, rsquare = analysis.calc_fit(
                 *self.prepared_data[self.subset.get()], self.test.get()
             )
 
@@ -258,7 +337,7 @@ class Analyzer:
             self.r_square.set(float("%.3g" % rsquare))
 
         def runAnalysisSimple():
-            ks, kv, ka, rsquare = self.calcFit(
+            ks, kv, ka, rsquare = analysis.calc_fit(
                 *self.prepared_data[self.subset.get()], self.test.get()
             )
 
@@ -267,6 +346,59 @@ class Analyzer:
             self.ka.set(float("%.3g" % ka))
             self.r_square.set(float("%.3g" % rsquare))
 
+        def parseValues(text, type=float, minimum=None):
+            values = [type(v) for v in text.replace(",", " ").split()]
+            if not values:
+                raise ValueError("no values given")
+            for v in values:
+                if minimum is not None and not v >= minimum:
+                    raise ValueError("%s is less than %s" % (v, minimum))
+            return values
+
+        def runSweep():
+            try:
+                windows = parseValues(self.sweep_windows.get(), int, minimum=1)
+                thresholds = parseValues(self.sweep_thresholds.get(), minimum=0)
+            except ValueError as e:
+                messagebox.showerror(
+                    "Error!",
+                    "Sweep windows must be lists of whole numbers of at least 1, "
+                    + "and thresholds lists of numbers of at least 0.\n"
+                    + "Details:\n"
+                    + str(e),
+                )
+                return
+
+            try:
+                results = analysis.sweep(
+                    self.stored_data,
+                    self.test.get(),
+                    windows,
+                    thresholds,
+                    self.units.get(),
+                    self.units_per_rot.get(),
+                )
+            except (AnalysisError, ValueError) as e:
+                messagebox.showerror("Error!", "The sweep failed.\n" + str(e))
+                return
+
+            subset = self.subset.get()
+            self._showTable(
+                subset + " Parameter Sweep",
+                analysis.format_sweep(results[subset], windows, thresholds),
+            )
+            self._plotSweep(subset, windows, thresholds, results[subset])
+
+        def compareSubsets():
+            fits = analysis.calc_fit_all(self.prepared_data, self.test.get())
+            asymmetry = analysis.fit_asymmetry(fits, self.test.get())
+            self._showTable("Subset Comparison", analysis.format_fits(fits, asymmetry))
+
+        def replayFits():
+            fits = analysis.calc_fit_all(self.prepared_data, self.test.get())
+            replays = analysis.replay_fits(self.prepared_data, self.test.get(), fits)
+            self._showTable("Model Replay", analysis.format_replay(replays))
+
         def plotTimeDomain():
             subset = self.subset.get()
             self._plotTimeDomain(subset, *self.prepared_data[subset])
@@ -281,117 +413,211 @@ class Analyzer:
 
         def calcGains():
 
-            period = (
-                self.period.get()
-                if not self.has_follower.get()
-                else self.follower_period.get()
+            kp, kd = analysis.calc_gains(
+                self.kv.get(),
+                self.ka.get(),
+                loop_type=self.loop_type.get(),
+                qp=self.qp.get(),
+                qv=self.qv.get(),
+                max_effort=self.max_effort.get(),
+                period=self.period.get(),
+                measurement_delay=self.measurement_delay.get(),
+                max_controller_output=self.max_controller_output.get(),
+                time_normalized=self.controller_time_normalized.get(),
+                follower_period=(
+                    self.follower_period.get() if self.has_follower.get() else None
+                ),
             )
 
-            if self.loop_type.get() == "Position":
-                kp, kd = self._calcGainsPos(
-                    self.kv.get(),
-                    self.ka.get(),
-                    self.qp.get(),
-                    self.qv.get(),
-                    self.max_effort.get(),
-                    period,
-                    self.measurement_delay.get(),
-                )
-            else:
-                kp, kd = self._calcGainsVel(
-                    self.kv.get(),
-                    self.ka.get(),
-                    self.qv.get(),
-                    self.max_effort.get(),
-                    period,
-                    self.measurement_delay.get(),
-                )
-
-            # Scale gains to output
-            kp = kp / 12 * self.max_controller_output.get()
-            kd = kd / 12 * self.max_controller_output.get()
-
-            # Rescale kD if not time-normalized
-            if not self.controller_time_normalized.get():
-                kd = kd / self.period.get()
-
-            # Get correct conversion factor for rotations
-            units = Units(self.units.get())
-            rotation = 0
-            if isRotation(units.value):
-                rotation = (1 * Units.ROTATIONS.unit).to(units.unit)
-            else:
-                rotation = self.units_per_rot.get()
-
             # Convert to controller-native units if desired
             if self.convert_gains.get():
-                if self.controller_type.get() == "Talon":
-                    kp = kp * rotation / (self.encoder_epr.get() * self.gearing.get())
-                    kd = kd * rotation / (self.encoder_epr.get() * self.gearing.get())
-                    if self.loop_type.get() == "Velocity":
-                        kp = kp * 10
-                if self.controller_type.get() == "Spark":
-                    kp = kp / (self.gearing.get())
-                    kd = kd / (self.gearing.get())
-                    if self.loop_type.get() == "Velocity":
-                        kp = kp / 60
+                kp, kd = analysis.convert_gains(
+                    kp,
+                    kd,
+                    self.controller_type.get(),
+                    self.loop_type.get(),
+                    self.units.get(),
+                    self.units_per_rot.get(),
+                    self.encoder_epr.get(),
+                    self.gearing.get(),
+                )
 
             self.kp.set(float("%.3g" % kp))
             self.kd.set(float("%.3g" % kd))
 
-        def calcTrackWidth(table):
+        # Settings the gain sweep can vary, and their calc_gains parameters
+        gainSweepSettings = {
+            "Position Error": "qp",
+            "Velocity Error": "qv",
+            "Control Effort": "max_effort",
+            "Controller Period": "period",
+            "Measurement Delay": "measurement_delay",
+        }
 
-            units = Units(self.units.get())
+        def runGainSweep():
+            xName, yName = self.gain_sweep_x.get(), self.gain_sweep_y.get()
+            if xName == yName:
+                messagebox.showerror("Error!", "The gain sweep needs two settings.")
+                return
 
-            # Doesn't run calculations if the units are rotational
-            if isRotation(units.value):
-                return "N/A"
+            try:
+                xs = np.array(parseValues(self.gain_sweep_x_values.get()))
+                ys = np.array(parseValues(self.gain_sweep_y_values.get()))
+            except ValueError as e:
+                messagebox.showerror(
+                    "Error!",
+                    "Gain sweep values must be lists of numbers.\n"
+                    + "Details:\n"
+                    + str(e),
+                )
+                return
 
-            # Get conversion factor
-            conversion_factor = 1
+            settings = {
+                "qp": self.qp.get(),
+                "qv": self.qv.get(),
+                "max_effort": self.max_effort.get(),
+                "period": self.period.get(),
+                "measurement_delay": self.measurement_delay.get(),
+            }
+            grid = {
+                gainSweepSettings[xName]: xs[:, np.newaxis],
+                gainSweepSettings[yName]: ys[np.newaxis, :],
+            }
+            settings.update(grid)
 
-            initial_units = Units(self.stored_data["units"])
+            followerPeriod = (
+                self.follower_period.get() if self.has_follower.get() else None
+            )
 
-            # handle the case where data recorded only rotational
-            if isRotation(self.stored_data["units"]):
-                # Convert to Rotations
-                units_per_rotation = (
-                    (self.stored_data["unitsPerRotation"] * initial_units.unit)
-                    .to(Units.ROTATIONS.unit)
-                    .magnitude
+            try:
+                results = analysis.sweep_gains(
+                    self.kv.get(),
+                    self.ka.get(),
+                    loop_type=self.loop_type.get(),
+                    max_controller_output=self.max_controller_output.get(),
+                    time_normalized=self.controller_time_normalized.get(),
+                    follower_period=followerPeriod,
+                    **settings,
                 )
 
-                # Convert to distance
-                conversion_factor = round(
-                    units_per_rotation * self.units_per_rot.get(), 3
+                # The simulation takes the gains in volts
+                volts = analysis.sweep_gains(
+                    self.kv.get(),
+                    self.ka.get(),
+                    loop_type=self.loop_type.get(),
+                    follower_period=followerPeriod,
+                    **settings,
                 )
-            else:
-                conversion_factor = self.units_per_rot.get()
+                metrics = simulation.step_response(
+                    self.sim_step_size.get(),
+                    self.sim_duration.get(),
+                    volts["kp"],
+                    volts["kd"],
+                    self.kv.get(),
+                    self.ka.get(),
+                    period=(
+                        settings["period"] if followerPeriod is None else followerPeriod
+                    ),
+                    measurement_delay=settings["measurement_delay"],
+                    loop_type=self.loop_type.get(),
+                    **simulatedPlant(),
+                )
+            except (ArithmeticError, ValueError, np.linalg.LinAlgError) as e:
+                messagebox.showerror(
+                    "Error!", "The gains could not be computed.\nDetails:\n" + str(e)
+                )
+                return
 
-            # Note that this assumes the gyro angle is not modded (i.e. on [0, +infinity)),
-            # and that a positive angle travels in the counter-clockwise direction
+            # Convert to controller-native units if desired
+            if self.convert_gains.get():
+                results["kp"], results["kd"] = analysis.convert_gains(
+                    results["kp"],
+                    results["kd"],
+                    self.controller_type.get(),
+                    self.loop_type.get(),
+                    self.units.get(),
+                    self.units_per_rot.get(),
+                    self.encoder_epr.get(),
+                    self.gearing.get(),
+                )
+
+            self._showTable(
+                "Gain Sweep", analysis.format_gain_sweep(results, grid, metrics)
+            )
+            self._plotGainSweep(xName, xs, yName, ys, results)
 
-            d_left = (
-                table[-1][R_ENCODER_P_COL] - table[0][R_ENCODER_P_COL]
-            ) * conversion_factor
-            d_right = (
-                table[-1][L_ENCODER_P_COL] - table[0][L_ENCODER_P_COL]
-            ) * conversion_factor
-            d_angle = table[-1][GYRO_ANGLE_COL] - table[0][GYRO_ANGLE_COL]
+        def simulatedPlant():
+            # The fitted model the gains are simulated against
+            test = Tests(self.test.get())
+            return {
+                "ks": self.ks.get(),
+                "kg": self.kg.get() if test == Tests.ELEVATOR else 0,
+                "kcos": self.kcos.get() if test == Tests.ARM else 0,
+                "units": self.units.get(),
+            }
 
-            if d_angle == 0:
+        def simulateGains():
+            size = self.sim_step_size.get()
+            if size == 0 or self.sim_duration.get() <= 0:
                 messagebox.showerror(
-                    "Error!",
-                    "Change in gyro angle was 0... Is your gyro set up correctly?",
+                    "Error!", "The step size and duration must not be zero."
                 )
-                return 0.0
+                return
+
+            loopType = self.loop_type.get()
+            followerPeriod = (
+                self.follower_period.get() if self.has_follower.get() else None
+            )
+            period = self.period.get() if followerPeriod is None else followerPeriod
+
+            # Gains in volts, with kD per second, for the simulation
+            kp, kd = analysis.calc_gains(
+                self.kv.get(),
+                self.ka.get(),
+                loop_type=loopType,
+                qp=self.qp.get(),
+                qv=self.qv.get(),
+                max_effort=self.max_effort.get(),
+                period=self.period.get(),
+                measurement_delay=self.measurement_delay.get(),
+                follower_period=followerPeriod,
+            )
+
+            reference = simulation.step_reference(
+                size, self.sim_duration.get(), period, loopType
+            )
+            result = simulation.simulate(
+                reference,
+                kp,
+                kd,
+                self.kv.get(),
+                self.ka.get(),
+                loop_type=loopType,
+                period=period,
+                measurement_delay=self.measurement_delay.get(),
+                **simulatedPlant(),
+            )
+            self._plotStepResponse(
+                loopType,
+                reference,
+                result,
+                simulation.step_metrics(result, size, loopType),
+            )
 
-            # The below comes from solving ω=(vr−vl)/2r for 2r
-            # Absolute values used to ensure the calculated value is always positive
-            # and to add robustness to sensor inversion
-            diameter = (abs(d_left) + abs(d_right)) / abs(d_angle)
+        def calcTrackWidth(table):
+            try:
+                track_width = analysis.calc_track_width(
+                    table,
+                    self.units.get(),
+                    self.stored_data["units"],
+                    self.stored_data["unitsPerRotation"],
+                    self.units_per_rot.get(),
+                )
+            except AnalysisError as e:
+                messagebox.showerror("Error!", str(e))
+                return 0.0
 
-            return diameter
+            return "N/A" if track_width is None else track_width
 
         def presetGains(*args):
             def setMeasurementDelay(delay):
@@ -545,17 +771,15 @@ class Analyzer:
             unitsMenu.configure(state="normal")
 
         def convertUnit(initUnits, finalUnits, unitsPerRot):
-            initUnits = Units(initUnits)
-            finalUnits = Units(finalUnits)
             if isRotation(finalUnits):
                 logger.info("Converting to rotational measure (fixed conversion)")
-                return round(
-                    (1 * Units.ROTATIONS.unit).to(finalUnits.unit).magnitude, 3
-                )
             else:
-                logger.info("Converting from %s to %s measure", initUnits, finalUnits)
-                dataUnitsPerRot = unitsPerRot * initUnits.unit
-                return round(dataUnitsPerRot.to(finalUnits.unit).magnitude, 3)
+                logger.info(
+                    "Converting from %s to %s measure",
+                    Units(initUnits),
+                    Units(finalUnits),
+                )
+            return analysis.convert_units_per_rot(initUnits, finalUnits, unitsPerRot)
 
         def enableErrorBounds(*args):
             if self.loop_type.get() == "Position":
@@ -588,8 +812,7 @@ class Analyzer:
                 if test == Tests.ARM:
                     kCosEntry.configure(state="readonly")
 
-        def isRotation(units):
-            return Units(units) in (Units.ROTATIONS, Units.RADIANS, Units.DEGREES)
+        isRotation = analysis.is_rotation
 
         # TOP OF WINDOW (FILE SELECTION)
 
@@ -679,6 +902,21 @@ class Analyzer:
         )
         fancyPlotButton.grid(row=4, column=0, sticky="ew")
 
+        sweepButton = Button(
+            ffFrame, text="Parameter Sweep", command=runSweep, state="disabled"
+        )
+        sweepButton.grid(row=5, column=0, sticky="ew")
+
+        compareButton = Button(
+            ffFrame, text="Compare Subsets", command=compareSubsets, state="disabled"
+        )
+        compareButton.grid(row=6, column=0, sticky="ew")
+
+        replayButton = Button(
+            ffFrame, text="Replay Fits", command=replayFits, state="disabled"
+        )
+        replayButton.grid(row=7, column=0, sticky="ew")
+
         Label(ffFrame, text="Accel Window Size:", anchor="e").grid(
             row=1, column=1, sticky="ew"
         )
@@ -693,6 +931,26 @@ class Analyzer:
         )
         thresholdEntry.grid(row=2, column=2)
 
+        Label(ffFrame, text="Sweep Window Sizes:", anchor="e").grid(
+            row=3, column=1, sticky="ew"
+        )
+        sweepWindowsEntry = Entry(ffFrame, textvariable=self.sweep_windows, width=15)
+        sweepWindowsEntry.grid(row=3, column=2)
+
+        Label(ffFrame, text="Sweep Motion Thresholds:", anchor="e").grid(
+            row=4, column=1, sticky="ew"
+        )
+        sweepThresholdsEntry = Entry(
+            ffFrame, textvariable=self.sweep_thresholds, width=15
+        )
+        sweepThresholdsEntry.grid(row=4, column=2)
+
+        Label(ffFrame, text="Plot Point Budget:", anchor="e").grid(
+            row=5, column=1, sticky="ew"
+        )
+        plotPointsEntry = IntEntry(ffFrame, textvariable=self.plot_points, width=5)
+        plotPointsEntry.grid(row=5, column=2)
+
         Label(ffFrame, text="kS:", anchor="e").grid(row=1, column=3, sticky="ew")
         kSEntry = FloatEntry(ffFrame, textvariable=self.ks, width=10)
         kSEntry.grid(row=1, column=4)
@@ -892,379 +1150,312 @@ class Analyzer:
         convertGains.grid(row=8, column=5)
         convertGains.configure(state="disabled")
 
-        for child in fbFrame.winfo_children():
-            child.grid_configure(padx=1, pady=1)
-
-    # From 449's R script (note: R is 1-indexed)
+        Label(fbFrame, text="Sweep Gains Over:", anchor="e").grid(
+            row=10, column=2, sticky="ew"
+        )
+        gainSweepXMenu = OptionMenu(
+            fbFrame, self.gain_sweep_x, *gainSweepSettings.keys()
+        )
+        gainSweepXMenu.configure(width=14)
+        gainSweepXMenu.grid(row=10, column=3)
+        gainSweepXEntry = Entry(
+            fbFrame, textvariable=self.gain_sweep_x_values, width=15
+        )
+        gainSweepXEntry.grid(row=10, column=4, columnspan=2)
 
-    def smoothDerivative(self, tm, value, n):
-        """
-        :param tm: time column
-        :param value: Value to take the derivative of
-        :param n: smoothing parameter
-        """
-        dlen = len(value)
-        dt = tm[n:dlen] - tm[: (dlen - n)]
-        x = (value[(n):dlen] - value[: (dlen - n)]) / dt
+        Label(fbFrame, text="And Over:", anchor="e").grid(row=11, column=2, sticky="ew")
+        gainSweepYMenu = OptionMenu(
+            fbFrame, self.gain_sweep_y, *gainSweepSettings.keys()
+        )
+        gainSweepYMenu.configure(width=14)
+        gainSweepYMenu.grid(row=11, column=3)
+        gainSweepYEntry = Entry(
+            fbFrame, textvariable=self.gain_sweep_y_values, width=15
+        )
+        gainSweepYEntry.grid(row=11, column=4, columnspan=2)
 
-        # pad to original length by adding zeros on either side
-        return np.pad(
-            x, (int(np.ceil(n / 2.0)), int(np.floor(n / 2.0))), mode="constant"
+        gainSweepButton = Button(
+            fbFrame, text="Sweep Gains", command=runGainSweep, state="disabled"
         )
+        gainSweepButton.grid(row=12, column=2, columnspan=3)
 
-    # Create one for one sided and one for 2 sided
-    def trim_quasi_testdata(self, data):
-        adata = np.abs(data)
-        test = Tests(self.test.get())
-        if test == Tests.DRIVETRAIN:
-            truth = np.all(
-                [
-                    adata[L_ENCODER_V_COL] > self.motion_threshold.get(),
-                    adata[L_VOLTS_COL] > 0,
-                    adata[R_ENCODER_V_COL] > self.motion_threshold.get(),
-                    adata[R_VOLTS_COL] > 0,
-                ],
-                axis=0,
-            )
-        else:
-            truth = np.all(
-                [
-                    adata[L_ENCODER_V_COL] > self.motion_threshold.get(),
-                    adata[L_VOLTS_COL] > 0,
-                ],
-                axis=0,
-            )
+        Label(fbFrame, text="Sim Step Size (units or units/s):", anchor="e").grid(
+            row=13, column=2, columnspan=2, sticky="ew"
+        )
+        stepSizeEntry = FloatEntry(fbFrame, textvariable=self.sim_step_size, width=10)
+        stepSizeEntry.grid(row=13, column=4)
 
-        temp = data.transpose()[truth].transpose()
+        Label(fbFrame, text="Sim Duration (s):", anchor="e").grid(
+            row=14, column=2, columnspan=2, sticky="ew"
+        )
+        durationEntry = FloatEntry(fbFrame, textvariable=self.sim_duration, width=10)
+        durationEntry.grid(row=14, column=4)
 
-        if temp[TIME_COL].size == 0:
-            messagebox.showinfo(
-                "Error!",
-                "No data in quasistatic test is above motion threshold. "
-                + "Try running with a smaller motion threshold (use --motion_threshold) "
-                + "and make sure your encoder is reporting correctly!",
-            )
-            return None
-        else:
-            return temp
+        simulateButton = Button(
+            fbFrame,
+            text="Simulate Step Response",
+            command=simulateGains,
+            state="disabled",
+        )
+        simulateButton.grid(row=15, column=2, columnspan=3)
 
-    def trim_step_testdata(self, data):
-        # removes anything before the max acceleration
-        max_accel_idx = np.argmax(np.abs(data[PREPARED_ACC_COL]))
-        return data[:, max_accel_idx + 1 :]
+        for child in fbFrame.winfo_children():
+            child.grid_configure(padx=1, pady=1)
 
-    def compute_accelDrive(self, data, window):
+    def prepare_data(self, data, window):
         """
-        Returned data columns correspond to PREPARED_*
+        Prepares the data for analysis with the current settings; see
+        analysis.prepare_data.  Errors are shown to the user, and None is
+        returned.
         """
-
-        # deal with incomplete data
-        if len(data[TIME_COL]) < window * 2:
-            messagebox.showinfo(
-                "Error!",
-                "Not enough data points to compute acceleration. "
-                + "Try running with a smaller window setting or a smaller threshold.",
+        if data is self.stored_data and self.stored_digest is None:
+            self.stored_digest = data_digest(data)
+
+        try:
+            dataset = self.prepared_cache.prepare_data(
+                data,
+                self.test.get(),
+                window,
+                self.motion_threshold.get(),
+                self.units.get(),
+                self.units_per_rot.get(),
+                digest=self.stored_digest if data is self.stored_data else None,
             )
+        except AnalysisError as e:
+            messagebox.showinfo("Error!", str(e))
             return None
 
-        # Compute left/right acceleration
-        l_acc = self.smoothDerivative(data[TIME_COL], data[L_ENCODER_V_COL], window)
-        r_acc = self.smoothDerivative(data[TIME_COL], data[R_ENCODER_V_COL], window)
+        return dataset
 
-        l = np.vstack(
-            (
-                data[TIME_COL],
-                data[L_VOLTS_COL],
-                data[L_ENCODER_P_COL],
-                data[L_ENCODER_V_COL],
-                l_acc,
-            )
-        )
-        r = np.vstack(
-            (
-                data[TIME_COL],
-                data[R_VOLTS_COL],
-                data[R_ENCODER_P_COL],
-                data[R_ENCODER_V_COL],
-                r_acc,
-            )
+    def _showTable(self, title, table):
+        window = tkinter.Toplevel(self.mainGUI)
+        window.title(title)
+
+        text = ScrolledText(window, width=90, height=20, font="TkFixedFont")
+        text.pack(fill=BOTH, expand=True)
+        text.insert(END, table)
+        text.configure(state="disabled")
+
+    def _figure(self, title, **kwargs):
+        # A blank figure for plots that are drawn from scratch every time.  The
+        # figure is reused while it's open, and closed with the others when a
+        # new file is loaded.
+        plt = pyplot()
+        cached = self.figures.get(title)
+        if cached is not None:
+            # Make it the current figure again, for tight_layout
+            fig = plt.figure(cached.fig.number)
+            fig.clf()
+            return fig
+
+        fig = plt.figure(title, **kwargs)
+        self.figures.add(title, fig, [])
+        return fig
+
+    def _plotSweep(self, subset, windows, thresholds, results):
+        # Heatmaps of each fitted value over the sweep.  Values that barely
+        # change across the map don't depend much on the settings.
+
+        names = list(results)
+        cols = math.ceil(len(names) / 2)
+
+        plt = pyplot()
+        fig = self._figure(subset + " Parameter Sweep", figsize=(4 * cols, 7))
+        for i, name in enumerate(names):
+            ax = fig.add_subplot(2, cols, i + 1)
+            values = results[name]
+            image = ax.imshow(values, origin="lower", aspect="auto", cmap="viridis")
+            fig.colorbar(image, ax=ax)
+
+            ax.set_title(name)
+            ax.set_xlabel("Motion Threshold")
+            ax.set_ylabel("Window Size")
+            ax.set_xticks(range(len(thresholds)))
+            ax.set_xticklabels(["%g" % t for t in thresholds])
+            ax.set_yticks(range(len(windows)))
+            ax.set_yticklabels(["%d" % w for w in windows])
+
+            # Label the cells if they are big enough to read
+            if values.size <= 36:
+                for (row, col), value in np.ndenumerate(values):
+                    ax.text(
+                        col,
+                        row,
+                        "%.3g" % value,
+                        ha="center",
+                        va="center",
+                        fontsize="x-small",
+                    )
+
+        # Fix overlapping axis labels
+        plt.tight_layout(pad=0.5)
+
+        plt.show()
+
+    def _plotGainSweep(self, xName, xs, yName, ys, results):
+        # Heatmaps of the gains over the sweep, and the closed-loop poles of
+        # every combination.  Poles closer to the origin respond faster;
+        # poles near the unit circle respond slowly or ring.
+
+        plt = pyplot()
+        fig = self._figure("Gain Sweep", figsize=(13, 4))
+        for i, (name, title) in enumerate((("kp", "kP"), ("kd", "kD"))):
+            ax = fig.add_subplot(1, 3, i + 1)
+            values = results[name]
+            image = ax.imshow(values, origin="lower", aspect="auto", cmap="viridis")
+            fig.colorbar(image, ax=ax)
+
+            ax.set_title(title)
+            ax.set_xlabel(yName)
+            ax.set_ylabel(xName)
+            ax.set_xticks(range(len(ys)))
+            ax.set_xticklabels(["%g" % y for y in ys])
+            ax.set_yticks(range(len(xs)))
+            ax.set_yticklabels(["%g" % x for x in xs])
+
+            # Label the cells if they are big enough to read
+            if values.size <= 36:
+                for (row, col), value in np.ndenumerate(values):
+                    ax.text(
+                        col,
+                        row,
+                        "%.3g" % value,
+                        ha="center",
+                        va="center",
+                        fontsize="x-small",
+                    )
+
+        ax = fig.add_subplot(1, 3, 3)
+        poles = results["poles"]
+        colors = np.broadcast_to(xs[:, np.newaxis, np.newaxis], poles.shape).ravel()
+        points = ax.scatter(
+            poles.real.ravel(), poles.imag.ravel(), c=colors, marker="x", s=20
         )
+        fig.colorbar(points, ax=ax, label=xName)
 
-        return l, r
+        angle = np.linspace(0, 2 * np.pi, 200)
+        ax.plot(np.cos(angle), np.sin(angle), "k--", linewidth=0.5)
+        ax.set_aspect("equal")
+        ax.set_title("Closed-Loop Poles")
+        ax.set_xlabel("Real")
+        ax.set_ylabel("Imaginary")
 
-    def compute_accel(self, data, window):
-        """
-        Returned data columns correspond to PREPARED_*
-        """
+        # Fix overlapping axis labels
+        plt.tight_layout(pad=0.5)
 
-        # deal with incomplete data
-        if len(data[TIME_COL]) < window * 2:
-            messagebox.showinfo(
-                "Error!",
-                "Not enough data points to compute acceleration. "
-                + "Try running with a smaller window setting or a smaller threshold.",
-            )
-            return None
+        plt.show()
 
-        # Compute left/right acceleration
-        acc = self.smoothDerivative(data[TIME_COL], data[L_ENCODER_V_COL], window)
+    def _plotStepResponse(self, loopType, reference, result, metrics):
+        # The simulated response next to the reference, and the voltage the
+        # controller asks for; time spent at the limit means the gains are
+        # too aggressive for the step.
 
-        dat = np.vstack(
-            (
-                data[TIME_COL],
-                data[L_VOLTS_COL],
-                data[L_ENCODER_P_COL],
-                data[L_ENCODER_V_COL],
-                acc,
+        if loopType == "Position":
+            output, target, label = result["position"], reference[0], "Position"
+        else:
+            output, target, label = result["velocity"], reference[1], "Velocity"
+        t = result["time"]
+
+        plt = pyplot()
+        fig = self._figure("Step Response", figsize=(8, 6))
+        fig.suptitle(
+            "Rise time %.3g s, overshoot %.1f%%, saturated %.0f%% of the time"
+            % (
+                metrics["rise_time"],
+                100 * metrics["overshoot"],
+                100 * metrics["saturation"],
             )
         )
 
-        return dat
+        ax = fig.add_subplot(2, 1, 1)
+        ax.plot(t, target, "k--", label="Reference")
+        ax.plot(t, output, label="Simulated")
+        ax.set_ylabel(label)
+        ax.legend()
 
-    def is_valid(self, *a_tuple):
-        for a in a_tuple:
-            if a is None:
-                return False
-        return True
+        ax = fig.add_subplot(2, 1, 2, sharex=ax)
+        ax.step(t, result["voltage"], where="post")
+        for limit in (-simulation.MAX_VOLTAGE, simulation.MAX_VOLTAGE):
+            ax.axhline(limit, color="r", linestyle=":", linewidth=0.8)
+        ax.set_xlabel("Time (s)")
+        ax.set_ylabel("Voltage")
 
-    def prepare_data_drivetrain(self, data, window):
-        """
-        Firstly, data should be 'trimmed' to exclude any data points at which the
-        robot was not being commanded to do anything.
-
-        Secondly, robot acceleration should be calculated from robot velocity and time.
-        We have found it effective to do this by taking the slope of the secant line
-        of velocity over a 60ms (3 standard loop iterations) window.
-
-        Thirdly, data from the quasi-static test should be trimmed to exclude the
-        initial period in which the robot is not moving due to static friction
-        Fourthly, data from the step-voltage acceleration tests must be trimmed to
-        remove the initial 'ramp-up' period that exists due to motor inductance; this
-        can be done by simply removing all data points before maximum acceleration is
-        reached.
-
-        Finally, the data can be analyzed: pool your trimmed data into four data sets
-        - one for each side of the robot (left or right) and each direction (forwards
-        or backwards).
-
-        For each set, run a linear regression of voltage seen at the motor
-        (or battery voltage if you do not have Talon SRXs) versus velocity and
-        acceleration.
-
-        Voltage should be in units of volts, velocity in units of feet per second,
-        and acceleration in units of feet per second squared.
-
-        Each data pool will then yield three parameters -
-        intercept, Kv (the regression coefficient of velocity), and Ka (the regression
-        coefficient of acceleration).
-        """
-        # ensure voltage sign matches velocity sign and converts rotation measurements into proper units
-        for x in JSON_DATA_KEYS:
-            data[x][L_VOLTS_COL] = np.copysign(
-                data[x][L_VOLTS_COL], data[x][L_ENCODER_V_COL]
-            )
-            data[x][R_VOLTS_COL] = np.copysign(
-                data[x][R_VOLTS_COL], data[x][R_ENCODER_V_COL]
-            )
-            data[x][R_ENCODER_V_COL] = (
-                np.array(data[x][R_ENCODER_V_COL]) * self.units_per_rot.get()
-            ).tolist()
-            data[x][L_ENCODER_V_COL] = (
-                np.array(data[x][L_ENCODER_V_COL]) * self.units_per_rot.get()
-            ).tolist()
-            data[x][R_ENCODER_P_COL] = (
-                np.array(data[x][R_ENCODER_V_COL]) * self.units_per_rot.get()
-            ).tolist()
-            data[x][L_ENCODER_P_COL] = (
-                np.array(data[x][L_ENCODER_V_COL]) * self.units_per_rot.get()
-            ).tolist()
-
-        # trim quasi data before computing acceleration
-        sf_trim = self.trim_quasi_testdata(data["slow-forward"])
-        sb_trim = self.trim_quasi_testdata(data["slow-backward"])
-
-        if sf_trim is None or sb_trim is None:
-            return [None] * 8
-
-        sf_l, sf_r = self.compute_accelDrive(sf_trim, window)
-        sb_l, sb_r = self.compute_accelDrive(sb_trim, window)
-
-        if sf_l is None or sf_r is None or sb_l is None or sb_r is None:
-            return [None] * 8
-
-        # trim step data after computing acceleration
-        ff_l, ff_r = self.compute_accelDrive(data["fast-forward"], window)
-        fb_l, fb_r = self.compute_accelDrive(data["fast-backward"], window)
-
-        if ff_l is None or ff_r is None or fb_l is None or fb_r is None:
-            return [None] * 8
-
-        ff_l = self.trim_step_testdata(ff_l)
-        ff_r = self.trim_step_testdata(ff_r)
-        fb_l = self.trim_step_testdata(fb_l)
-        fb_r = self.trim_step_testdata(fb_r)
-
-        dataset = {
-            "Forward Left": [sf_l, ff_l],
-            "Forward Right": [sf_r, ff_r],
-            "Backward Left": [sb_l, fb_l],
-            "Backward Right": [sb_r, fb_r],
-            "Forward Combined": [
-                np.concatenate((sf_l, sf_r), axis=1),
-                np.concatenate((ff_l, ff_r), axis=1),
-            ],
-            "Backward Combined": [
-                np.concatenate((sb_l, sb_r), axis=1),
-                np.concatenate((fb_l, fb_r), axis=1),
-            ],
-            "All Combined": [
-                np.concatenate((sf_l, sb_l, sf_r, sb_r), axis=1),
-                np.concatenate((ff_l, fb_l, ff_r, ff_r), axis=1),
-            ],
-            "Valid": self.is_valid(sf_l, sb_l, ff_l, fb_l, sf_r, sb_r, ff_r, fb_r),
-        }
-
-        return dataset
+        # Fix overlapping axis labels
+        plt.tight_layout(pad=0.5)
 
-    def prepare_data(self, ogData, window):
-        """
-        Firstly, data should be 'trimmed' to exclude any data points at which the
-        robot was not being commanded to do anything.
-
-        Secondly, robot acceleration should be calculated from robot velocity and time.
-        We have found it effective to do this by taking the slope of the secant line
-        of velocity over a 60ms (3 standard loop iterations) window.
-
-        Thirdly, data from the quasi-static test should be trimmed to exclude the
-        initial period in which the robot is not moving due to static friction
-        Fourthly, data from the step-voltage acceleration tests must be trimmed to
-        remove the initial 'ramp-up' period that exists due to motor inductance; this
-        can be done by simply removing all data points before maximum acceleration is
-        reached.
-
-        Finally, the data can be analyzed: pool your trimmed data into four data sets
-        - one for each side of the robot (left or right) and each direction (forwards
-        or backwards).
-
-        For each set, run a linear regression of voltage seen at the motor
-        (or battery voltage if you do not have Talon SRXs) versus velocity and
-        acceleration.
-
-        Voltage should be in units of volts, velocity in units of feet per second,
-        and acceleration in units of feet per second squared.
-
-        Each data pool will then yield three parameters -
-        intercept, Kv (the regression coefficient of velocity), and Ka (the regression
-        coefficient of acceleration).
-        """
-        # create a copy so original data doesn't get changed
-        data = copy.deepcopy(ogData)
+        plt.show()
 
-        test = Tests(self.test.get())
-        if test == Tests.DRIVETRAIN:
-            return self.prepare_data_drivetrain(data, window)
-        else:
-            # Ensure voltage points in same direction as velocity
-            for x in JSON_DATA_KEYS:
-                data[x][L_VOLTS_COL] = np.copysign(
-                    data[x][L_VOLTS_COL], data[x][L_ENCODER_V_COL]
-                )
-                data[x][L_ENCODER_V_COL] = (
-                    np.array(data[x][L_ENCODER_V_COL]) * self.units_per_rot.get()
-                ).tolist()
-                data[x][L_ENCODER_P_COL] = (
-                    np.array(data[x][L_ENCODER_V_COL]) * self.units_per_rot.get()
-                ).tolist()
-
-            # trim quasi data before computing acceleration
-            sf_trim = self.trim_quasi_testdata(data["slow-forward"])
-            sb_trim = self.trim_quasi_testdata(data["slow-backward"])
-
-            if sf_trim is None or sb_trim is None:
-                return None, None, None, None
-
-            sf = self.compute_accel(sf_trim, window)
-            sb = self.compute_accel(sb_trim, window)
-
-            if sf is None or sb is None:
-                return None, None, None, None
-
-            # trim step data after computing acceleration
-            ff = self.compute_accel(data["fast-forward"], window)
-            fb = self.compute_accel(data["fast-backward"], window)
-
-            if ff is None or fb is None:
-                return None, None, None, None
-
-            ff = self.trim_step_testdata(ff)
-            fb = self.trim_step_testdata(fb)
-
-            dataset = {
-                "Forward": [sf, ff],
-                "Backward": [sb, fb],
-                "Combined": [
-                    np.concatenate((sf, sb), axis=1),
-                    np.concatenate((ff, fb), axis=1),
-                ],
-                "Valid": self.is_valid(sf, sb, ff, fb),
-            }
-            return dataset
+    def _plotPoints(self, *coords, line=False):
+        # Thins the points of a plot down to the point budget, with LTTB for
+        # time series (run by run, for the combined subsets) and density
+        # binning for scatter plots; see downsample
+        budget = self.plot_points.get()
+        if budget <= 0 or len(coords[0]) <= budget:
+            return coords
 
-    def ols(self, x1, x2, x3, y):
-        """multivariate linear regression using ordinary least squares"""
-        if x3:
-            x = np.array((np.sign(x1), x1, x2, x3)).T
+        if line:
+            idx = downsample.lttb_runs(*coords, budget)
         else:
-            x = np.array((np.sign(x1), x1, x2)).T
-        model = sm.OLS(y, x)
-        return model.fit()
+            idx = downsample.density_sample(coords, budget)
+        return tuple(np.asarray(c)[idx] for c in coords)
 
     def _plotTimeDomain(self, subset, qu, step):
-        vel = np.concatenate((qu[PREPARED_VEL_COL], step[PREPARED_VEL_COL]))
-        accel = np.concatenate((qu[PREPARED_ACC_COL], step[PREPARED_ACC_COL]))
-        volts = np.concatenate((qu[PREPARED_V_COL], step[PREPARED_V_COL]))
-        time = np.concatenate((qu[PREPARED_TM_COL], step[PREPARED_TM_COL]))
-
         # Time-domain plots.
         # These should show if anything went horribly wrong during the tests.
         # Useful for diagnosing the data trim; quasistatic test should look purely linear with no leading 'tail'
 
-        plt.figure(subset + " Time-Domain Plots")
-
-        # quasistatic vel and accel vs time
-        ax1 = plt.subplot(221)
-        ax1.set_xlabel("Time")
-        ax1.set_ylabel("Velocity")
-        ax1.set_title("Quasistatic velocity vs time")
-        plt.scatter(qu[PREPARED_TM_COL], qu[PREPARED_VEL_COL], marker=".", c="#000000")
-
-        ax = plt.subplot(222, sharey=ax1)
-        ax.set_xlabel("Time")
-        ax.set_ylabel("Velocity")
-        ax.set_title("Dynamic velocity vs time")
-        plt.scatter(
-            step[PREPARED_TM_COL], step[PREPARED_VEL_COL], marker=".", c="#000000"
-        )
-
-        # dynamic vel and accel vs time
-        ax2 = plt.subplot(223)
-        ax2.set_xlabel("Time")
-        ax2.set_ylabel("Acceleration")
-        ax2.set_title("Quasistatic acceleration vs time")
-        plt.scatter(qu[PREPARED_TM_COL], qu[PREPARED_ACC_COL], marker=".", c="#000000")
-
-        ax = plt.subplot(224, sharey=ax2)
-        ax.set_xlabel("Time")
-        ax.set_ylabel("Acceleration")
-        ax.set_title("Dynamic acceleration vs time")
-        plt.scatter(
-            step[PREPARED_TM_COL], step[PREPARED_ACC_COL], marker=".", c="#000000"
-        )
-
-        # Fix overlapping axis labels
-        plt.tight_layout(pad=0.5)
-
-        plt.show()
+        title = subset + " Time-Domain Plots"
+        cached = self.figures.get(title)
+        new = cached is None
+        if new:
+            plt = pyplot()
+            fig = plt.figure(title)
+
+            # quasistatic vel and accel vs time
+            ax1 = fig.add_subplot(221)
+            ax1.set_xlabel("Time")
+            ax1.set_ylabel("Velocity")
+            ax1.set_title("Quasistatic velocity vs time")
+
+            ax2 = fig.add_subplot(222, sharey=ax1)
+            ax2.set_xlabel("Time")
+            ax2.set_ylabel("Velocity")
+            ax2.set_title("Dynamic velocity vs time")
+
+            # dynamic vel and accel vs time
+            ax3 = fig.add_subplot(223)
+            ax3.set_xlabel("Time")
+            ax3.set_ylabel("Acceleration")
+            ax3.set_title("Quasistatic acceleration vs time")
+
+            ax4 = fig.add_subplot(224, sharey=ax3)
+            ax4.set_xlabel("Time")
+            ax4.set_ylabel("Acceleration")
+            ax4.set_title("Dynamic acceleration vs time")
+
+            artists = [
+                ax.scatter([], [], marker=".", c="#000000")
+                for ax in (ax1, ax2, ax3, ax4)
+            ]
+            cached = self.figures.add(title, fig, artists)
+
+        for artist, (data, col) in zip(
+            cached.artists,
+            (
+                (qu, PREPARED_VEL_COL),
+                (step, PREPARED_VEL_COL),
+                (qu, PREPARED_ACC_COL),
+                (step, PREPARED_ACC_COL),
+            ),
+        ):
+            points = self._plotPoints(data[PREPARED_TM_COL], data[col], line=True)
+            artist.set_offsets(np.column_stack(points))
+            plot_cache.rescale(artist.axes, points)
+
+        if new:
+            # Fix overlapping axis labels
+            cached.fig.tight_layout(pad=0.5)
+        self._showFigure(cached, new)
 
     def _plotVoltageDomain(self, subset, qu, step):
 
@@ -1274,173 +1465,181 @@ class Analyzer:
         # Both plots should be straight lines through the origin
         # Fit lines will be straight lines through the origin by construction; data should match fit
 
-        vel = np.concatenate((qu[PREPARED_VEL_COL], step[PREPARED_VEL_COL]))
-        accel = np.concatenate((qu[PREPARED_ACC_COL], step[PREPARED_ACC_COL]))
-        volts = np.concatenate((qu[PREPARED_V_COL], step[PREPARED_V_COL]))
-        time = np.concatenate((qu[PREPARED_TM_COL], step[PREPARED_TM_COL]))
-
         ks = self.ks.get()
         kv = self.kv.get()
         ka = self.ka.get()
-        r_square = self.r_square.get()
-
         kcos = self.kcos.get()
         kg = self.kg.get()
 
-        plt.figure(subset + " Voltage-Domain Plots")
-
-        # quasistatic vel vs. vel-causing voltage
-        ax = plt.subplot(211)
-        ax.set_xlabel("Velocity-Portion Voltage")
-        ax.set_ylabel("Velocity")
-        ax.set_title("Quasistatic velocity vs velocity-portion voltage")
-
         test = Tests(self.test.get())
-        if test == Tests.ELEVATOR:
-            plt.scatter(
-                qu[PREPARED_V_COL]
-                - kg
-                - ks * np.sign(qu[PREPARED_VEL_COL])
-                - ka * qu[PREPARED_ACC_COL],
-                qu[PREPARED_VEL_COL],
-                marker=".",
-                c="#000000",
-            )
-        elif test == Tests.ARM:
-            plt.scatter(
-                qu[PREPARED_V_COL]
-                - ks * np.sign(qu[PREPARED_VEL_COL])
-                - ka * qu[PREPARED_ACC_COL]
-                - kcos * qu[PREPARED_COS_COL],
-                qu[PREPARED_VEL_COL],
-                marker=".",
-                c="#000000",
-            )
-        else:
-            plt.scatter(
-                qu[PREPARED_V_COL]
-                - ks * np.sign(qu[PREPARED_VEL_COL])
-                - ka * qu[PREPARED_ACC_COL],
-                qu[PREPARED_VEL_COL],
-                marker=".",
-                c="#000000",
-            )
+        supplemental = test == Tests.ELEVATOR or test == Tests.ARM
 
-        # show fit line from multiple regression
-        y = np.linspace(np.min(qu[PREPARED_VEL_COL]), np.max(qu[PREPARED_VEL_COL]))
-        plt.plot(kv * y, y)
+        def gravity(data):
+            # The portion of the voltage holding up the mechanism
+            if test == Tests.ELEVATOR:
+                return kg
+            elif test == Tests.ARM:
+                return kcos * data[PREPARED_COS_COL]
+            return 0
+
+        title = subset + " Voltage-Domain Plots"
+        cached = self.figures.get(title)
+        if cached is not None and len(cached.artists) != (6 if supplemental else 4):
+            # Drawn for another test, with or without the supplemental graph
+            pyplot().close(cached.fig)
+            cached = None
+        new = cached is None
+        if new:
+            plt = pyplot()
+            fig = plt.figure(title)
+            rows = 3 if supplemental else 2
+
+            # quasistatic vel vs. vel-causing voltage
+            ax1 = fig.add_subplot(rows, 1, 1)
+            ax1.set_xlabel("Velocity-Portion Voltage")
+            ax1.set_ylabel("Velocity")
+            ax1.set_title("Quasistatic velocity vs velocity-portion voltage")
+
+            # dynamic accel vs. accel-causing voltage
+            ax2 = fig.add_subplot(rows, 1, 2)
+            ax2.set_xlabel("Acceleration-Portion Voltage")
+            ax2.set_ylabel("Acceleration")
+            ax2.set_title("Dynamic acceleration vs acceleration-portion voltage")
+
+            axes = [ax1, ax2]
+
+            # Supplemental graphs (Elevator and Arm)
+            if test == Tests.ELEVATOR:
+                ax3 = fig.add_subplot(rows, 1, 3)
+                ax3.set_xlabel("Friction-loss voltage")
+                ax3.set_ylabel("Velocity")
+                ax3.set_title("Quasistatic velocity vs friction-loss voltage")
+                axes.append(ax3)
+            elif test == Tests.ARM:
+                ax3 = fig.add_subplot(rows, 1, 3)
+                ax3.set_xlabel("Gravity (cosine)-Portion Voltage")
+                ax3.set_ylabel("Angle")
+                ax3.set_title("Quasistatic angle vs gravity-portion voltage")
+                axes.append(ax3)
+
+            # Data, and the fit line from multiple regression
+            artists = []
+            for ax in axes:
+                artists.append(ax.scatter([], [], marker=".", c="#000000"))
+                artists.extend(ax.plot([], []))
+            cached = self.figures.add(title, fig, artists)
+
+        qu_vel = qu[PREPARED_VEL_COL]
+        step_vel = step[PREPARED_VEL_COL]
+
+        plots = []
+
+        y = np.linspace(np.min(qu_vel), np.max(qu_vel))
+        plots.append(
+            (
+                (
+                    qu[PREPARED_V_COL]
+                    - gravity(qu)
+                    - ks * np.sign(qu_vel)
+                    - ka * qu[PREPARED_ACC_COL],
+                    qu_vel,
+                ),
+                (kv * y, y),
+            )
+        )
 
-        # dynamic accel vs. accel-causing voltage
-        ax = plt.subplot(212)
-        ax.set_xlabel("Acceleration-Portion Voltage")
-        ax.set_ylabel("Acceleration")
-        ax.set_title("Dynamic acceleration vs acceleration-portion voltage")
+        y = np.linspace(np.min(step[PREPARED_ACC_COL]), np.max(step[PREPARED_ACC_COL]))
+        plots.append(
+            (
+                (
+                    step[PREPARED_V_COL]
+                    - gravity(step)
+                    - ks * np.sign(step_vel)
+                    - kv * step_vel,
+                    step[PREPARED_ACC_COL],
+                ),
+                (ka * y, y),
+            )
+        )
 
         if test == Tests.ELEVATOR:
-            plt.scatter(
-                step[PREPARED_V_COL]
-                - kg
-                - ks * np.sign(step[PREPARED_VEL_COL])
-                - kv * step[PREPARED_VEL_COL],
-                step[PREPARED_ACC_COL],
-                marker=".",
-                c="#000000",
+            y = np.linspace(np.min(qu_vel), np.max(qu_vel))
+            plots.append(
+                (
+                    (
+                        qu[PREPARED_V_COL]
+                        - kg
+                        - kv * qu_vel
+                        - ka * qu[PREPARED_ACC_COL],
+                        qu_vel,
+                    ),
+                    (ks * np.sign(y), y),
+                )
             )
         elif test == Tests.ARM:
-            plt.scatter(
-                step[PREPARED_V_COL]
-                - ks * np.sign(step[PREPARED_VEL_COL])
-                - kv * step[PREPARED_VEL_COL]
-                - kcos * step[PREPARED_COS_COL],
-                step[PREPARED_ACC_COL],
-                marker=".",
-                c="#000000",
-            )
-        else:
-            plt.scatter(
-                step[PREPARED_V_COL]
-                - ks * np.sign(step[PREPARED_VEL_COL])
-                - kv * step[PREPARED_VEL_COL],
-                step[PREPARED_ACC_COL],
-                marker=".",
-                c="#000000",
-            )
-
-        # show fit line from multiple regression
-        y = np.linspace(np.min(step[PREPARED_ACC_COL]), np.max(step[PREPARED_ACC_COL]))
-        plt.plot(ka * y, y)
-
-        # Fix overlapping axis labels
-        plt.tight_layout(pad=0.5)
-
-        # Supplemental graphs (Elevator and Arm)
-        if test == Tests.ELEVATOR or test == Tests.ARM:
-            ax = plt.subplot(111)
-            # show fit line from multiple regression
             y = np.linspace(np.min(qu[PREPARED_POS_COL]), np.max(qu[PREPARED_POS_COL]))
-
-            if test == Tests.ELEVATOR:
-                ax.set_xlabel("Friction-loss voltage")
-                ax.set_ylabel("Velocity")
-                ax.set_title("Quasistatic velocity vs friction-loss voltage")
-                plt.scatter(
-                    qu[PREPARED_V_COL]
-                    - kg
-                    - kv * qu[PREPARED_VEL_COL]
-                    - ka * qu[PREPARED_ACC_COL],
-                    qu[PREPARED_VEL_COL],
-                    marker=".",
-                    c="#000000",
-                )
-                plt.plot(ks * np.sign(y), y)
-            else:
-                ax.set_xlabel("Gravity (cosine)-Portion Voltage")
-                ax.set_ylabel("Angle")
-                ax.set_title("Quasistatic angle vs gravity-portion voltage")
-                plt.scatter(
-                    qu[PREPARED_V_COL]
-                    - ks * np.sign(qu[PREPARED_VEL_COL])
-                    - kv * qu[PREPARED_VEL_COL]
-                    - ka * qu[PREPARED_ACC_COL],
-                    qu[PREPARED_POS_COL],
-                    marker=".",
-                    c="#000000",
+            plots.append(
+                (
+                    (
+                        qu[PREPARED_V_COL]
+                        - ks * np.sign(qu_vel)
+                        - kv * qu_vel
+                        - ka * qu[PREPARED_ACC_COL],
+                        qu[PREPARED_POS_COL],
+                    ),
+                    (kcos * np.cos(analysis.arm_angle(y, self.units.get())), y),
                 )
-                units = Units(self.units.get())
-                if units == Units.DEGREES:
-                    plt.plot(kcos * np.cos(np.radians(y)), y)
-                elif units == Units.RADIANS:
-                    plt.plot(kcos * np.cos(y), y)
-                else:
-                    plt.plot(kcos * np.cos(math.pi * 2 * y), y)
-            plt.tight_layout(pad=0.5)
+            )
 
-        plt.show()
+        for (scatter, line), (points, fit) in zip(
+            zip(cached.artists[::2], cached.artists[1::2]), plots
+        ):
+            points = self._plotPoints(*points)
+            scatter.set_offsets(np.column_stack(points))
+            line.set_data(*fit)
+            plot_cache.rescale(scatter.axes, points, fit)
+
+        if new:
+            # Fix overlapping axis labels
+            cached.fig.tight_layout(pad=0.5)
+        self._showFigure(cached, new)
 
     def _plot3D(self, subset, qu, step):
 
         vel = np.concatenate((qu[PREPARED_VEL_COL], step[PREPARED_VEL_COL]))
         accel = np.concatenate((qu[PREPARED_ACC_COL], step[PREPARED_ACC_COL]))
         volts = np.concatenate((qu[PREPARED_V_COL], step[PREPARED_V_COL]))
-        time = np.concatenate((qu[PREPARED_TM_COL], step[PREPARED_TM_COL]))
 
         ks = self.ks.get()
         kv = self.kv.get()
         ka = self.ka.get()
         kcos = self.kcos.get()
         kg = self.kg.get()
-        r_square = self.r_square.get()
 
         # Interactive 3d plot of voltage over entire vel-accel plane
         # Really cool, not really any more diagnostically-useful than prior plots but worth seeing
-        plt.figure(subset + " 3D Vel-Accel Plane Plot")
-
-        ax = plt.subplot(111, projection="3d")
+        title = subset + " 3D Vel-Accel Plane Plot"
+        cached = self.figures.get(title)
+        new = cached is None
+        if new:
+            plt = pyplot()
+            fig = plt.figure(title)
+
+            ax = fig.add_subplot(111, projection="3d")
+
+            # 3D scatterplot
+            ax.set_xlabel("Velocity")
+            ax.set_ylabel("Acceleration")
+            ax.set_zlabel("Voltage")
+
+            # The best fit plane is replaced on every update, as surfaces
+            # can't be changed in place
+            cached = self.figures.add(
+                title, fig, [ax.scatter([], [], []), None], blit=False
+            )
 
-        # 3D scatterplot
-        ax.set_xlabel("Velocity")
-        ax.set_ylabel("Acceleration")
-        ax.set_zlabel("Voltage")
+        scatter, surface = cached.artists
+        ax = scatter.axes
 
         # Show best fit plane
         vv, aa = np.meshgrid(
@@ -1451,161 +1650,38 @@ class Analyzer:
         test = Tests(self.test.get())
         if test == Tests.ELEVATOR:
             ax.set_title("Friction-adjusted Voltage vs velocity and acceleration")
-            ax.scatter(vel, accel, volts - ks * np.sign(vel))
-            ax.plot_surface(vv, aa, kg + kv * vv + ka * aa, alpha=0.2, color=[0, 1, 1])
+            points = self._plotPoints(vel, accel, volts - ks * np.sign(vel))
+            plane = kg + kv * vv + ka * aa
         elif test == Tests.ARM:
             cos = np.concatenate((qu[PREPARED_COS_COL], step[PREPARED_COS_COL]))
             ax.set_title("Cosine-adjusted Voltage vs velocity and acceleration")
-            ax.scatter(vel, accel, volts - kcos * cos)
-            ax.plot_surface(
-                vv, aa, ks * np.sign(vv) + kv * vv + ka * aa, alpha=0.2, color=[0, 1, 1]
-            )
+            points = self._plotPoints(vel, accel, volts - kcos * cos)
+            plane = ks * np.sign(vv) + kv * vv + ka * aa
         else:
             ax.set_title("Voltage vs velocity and acceleration")
-            ax.scatter(vel, accel, volts)
-            ax.plot_surface(
-                vv, aa, ks * np.sign(vv) + kv * vv + ka * aa, alpha=0.2, color=[0, 1, 1]
-            )
-
-        plt.show()
-
-    def calcFit(self, qu, step, test):
-        vel = np.concatenate((qu[PREPARED_VEL_COL], step[PREPARED_VEL_COL]))
-        accel = np.concatenate((qu[PREPARED_ACC_COL], step[PREPARED_ACC_COL]))
-        volts = np.concatenate((qu[PREPARED_V_COL], step[PREPARED_V_COL]))
-        time = np.concatenate((qu[PREPARED_TM_COL], step[PREPARED_TM_COL]))
-
-        test = Tests(test)
-        if test == Tests.ELEVATOR:
-            fit = self.ols(vel, accel, np.ones(vel.size), volts)
-            ks, kv, ka, kg = fit.params
-            rsquare = fit.rsquared
-            return kg, ks, kv, ka, rsquare
-        elif test == Tests.ARM:
-            cos = np.concatenate((qu[PREPARED_COS_COL], step[PREPARED_COS_COL]))
-            fit = self.ols(vel, accel, cos, volts)
-            ks, kv, ka, kcos = fit.params
-            rsquare = fit.rsquared
-            return ks, kv, ka, kcos, rsquare
-        else:
-            fit = self.ols(vel, accel, None, volts)
-            ks, kv, ka = fit.params
-            rsquare = fit.rsquared
-        return ks, kv, ka, rsquare
-
-    def _calcGainsPos(self, kv, ka, qp, qv, effort, period, position_delay):
-
-        # If acceleration requires no effort, velocity becomes an input for position
-        # control. We choose an appropriate model in this case to avoid numerical
-        # instabilities in LQR.
-        if ka > 1e-7:
-            A = np.array([[0, 1], [0, -kv / ka]])
-            B = np.array([[0], [1 / ka]])
-            C = np.array([[1, 0]])
-            D = np.array([[0]])
-
-            q = [qp, qv]  # units and units/s acceptable errors
-            r = [effort]  # V acceptable actuation effort
+            points = self._plotPoints(vel, accel, volts)
+            plane = ks * np.sign(vv) + kv * vv + ka * aa
+
+        scatter._offsets3d = points
+        if surface is not None:
+            surface.remove()
+        cached.artists[1] = ax.plot_surface(vv, aa, plane, alpha=0.2, color=[0, 1, 1])
+        ax.auto_scale_xyz(*points, had_data=False)
+
+        self._showFigure(cached, new)
+
+    def _showFigure(self, cached, new):
+        # Shows a new figure, or redraws the updated artists of one already
+        # shown
+        if new:
+            pyplot().show()
         else:
-            A = np.array([[0]])
-            B = np.array([[1]])
-            C = np.array([[1]])
-            D = np.array([[0]])
-
-            q = [qp]  # units acceptable error
-            r = [qv]  # units/s acceptable error
-        sys = cnt.ss(A, B, C, D)
-        dsys = sys.sample(period)
-
-        # Assign Q and R matrices according to Bryson's rule [1]. The elements
-        # of q and r are tunable by the user.
-        #
-        # [1] 'Bryson's rule' in
-        #     https://file.tavsys.net/control/state-space-guide.pdf
-        Q = np.diag(1.0 / np.square(q))
-        R = np.diag(1.0 / np.square(r))
-        K = frccnt.lqr(dsys, Q, R)
-
-        if position_delay > 0:
-            # This corrects the gain to compensate for measurement delay, which
-            # can be quite large as a result of filtering for some motor
-            # controller and sensor combinations. Note that this will result in
-            # an overly conservative (i.e. non-optimal) gain, because we need to
-            # have a time-varying control gain to give the system an initial kick
-            # in the right direction. The state will converge to zero and the
-            # controller gain will converge to the steady-state one the tool outputs.
-            #
-            # See E.4.2 in
-            #   https://file.tavsys.net/control/controls-engineering-in-frc.pdf
-            delay_in_seconds = position_delay / 1000  # ms -> s
-            K = K @ np.linalg.matrix_power(
-                dsys.A - dsys.B @ K, round(delay_in_seconds / period)
-            )
-
-        # With the alternate model, `kp = kv * K[0, 0]` is used because the gain
-        # produced by LQR is for velocity. We can use the feedforward equation
-        # `u = kv * v` to convert velocity to voltage. `kd = 0` because velocity
-        # was an input; we don't need feedback control to command it.
-        if ka > 1e-7:
-            kp = K[0, 0]
-            kd = K[0, 1]
-        else:
-            kp = kv * K[0, 0]
-            kd = 0
-
-        return kp, kd
-
-    def _calcGainsVel(self, kv, ka, qv, effort, period, velocity_delay):
-
-        # If acceleration for velocity control requires no effort, the feedback
-        # control gains approach zero. We special-case it here because numerical
-        # instabilities arise in LQR otherwise.
-        if ka < 1e-7:
-            return 0, 0
-
-        A = np.array([[-kv / ka]])
-        B = np.array([[1 / ka]])
-        C = np.array([[1]])
-        D = np.array([[0]])
-        sys = cnt.ss(A, B, C, D)
-        dsys = sys.sample(period)
-
-        # Assign Q and R matrices according to Bryson's rule [1]. The elements
-        # of q and r are tunable by the user.
-        #
-        # [1] 'Bryson's rule' in
-        #     https://file.tavsys.net/control/state-space-guide.pdf
-        q = [qv]  # units/s acceptable error
-        r = [effort]  # V acceptable actuation effort
-        Q = np.diag(1.0 / np.square(q))
-        R = np.diag(1.0 / np.square(r))
-        K = frccnt.lqr(dsys, Q, R)
-
-        if velocity_delay > 0:
-            # This corrects the gain to compensate for measurement delay, which
-            # can be quite large as a result of filtering for some motor
-            # controller and sensor combinations. Note that this will result in
-            # an overly conservative (i.e. non-optimal) gain, because we need to
-            # have a time-varying control gain to give the system an initial kick
-            # in the right direction. The state will converge to zero and the
-            # controller gain will converge to the steady-state one the tool outputs.
-            #
-            # See E.4.2 in
-            #   https://file.tavsys.net/control/controls-engineering-in-frc.pdf
-            delay_in_seconds = velocity_delay / 1000  # ms -> s
-            K = K @ np.linalg.matrix_power(
-                dsys.A - dsys.B @ K, round(delay_in_seconds / period)
-            )
-
-        kp = K[0, 0]
-        kd = 0
-
-        return kp, kd
+            cached.redraw()
 
 
-def main(dir):
+def main(dir, cache_dir=None):
 
-    analyzer = Analyzer(dir)
+    analyzer = Analyzer(dir, cache_dir=cache_dir)
 
     analyzer.mainGUI.title("FRC Drive Characterization Tool")
 
@@ -0,0 +1,178 @@
+# Reading and writing of characterization run files.
+#
+# Runs are stored in a small versioned binary format so that long sessions can
+# be saved and reopened quickly.  The layout is:
+#
+#   magic (8 bytes) | version (uint32) | header length (uint32) | header (JSON)
+#   | padding | one float64 column block per run
+#
+# The header holds the session metadata (test, units, unitsPerRotation) and,
+# for every run, the offset and shape of its column block.  Blocks are stored
+# as little-endian float64 arrays of shape (columns, samples) and aligned to
+# ALIGNMENT bytes, so each column is contiguous on disk and can be memory-mapped
+# directly.
+#
+# The indented JSON format written by older versions of the logger is still
+# supported for import and export.
+#
+# In memory, a session is a dict holding the metadata values plus one array of
+# shape (columns, samples) per run, which is the layout used by the analyzer.
+
+import json
+import os
+import struct
+
+import numpy as np
+from frc_characterization.logger_analyzer.columns import NUM_COLUMNS
+
+MAGIC = b"FRCCHAR\x00"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+BINARY_EXTENSION = ".frcchar"
+JSON_EXTENSION = ".json"
+
+_PREAMBLE = struct.Struct("<8sII")
+_DTYPE = np.dtype("<f8")
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _is_run(value):
+    return not isinstance(value, (str, bytes, int, float, bool)) and value is not None
+
+
+def _as_run(value):
+    run = np.asarray(value, dtype=_DTYPE)
+    # A test that failed or was skipped leaves an empty run, which comes out of
+    # JSON as [] rather than with a column dimension
+    if run.size == 0 and run.ndim != 2:
+        run = run.reshape(NUM_COLUMNS, 0)
+    return run
+
+
+def is_binary(path):
+    """
+    :param path: path of a run file
+    :returns: True if the file is in the binary run format
+    """
+    with open(path, "rb") as fp:
+        return fp.read(len(MAGIC)) == MAGIC
+
+
+def write(path, data):
+    """
+    Writes a session to disk.  The format is chosen from the file extension;
+    anything other than .json is written in the binary format.
+
+    :param path: destination file
+    :param data: dict of metadata values and per-run (columns, samples) arrays
+    """
+    if os.path.splitext(path)[1].lower() == JSON_EXTENSION:
+        write_json(path, data)
+    else:
+        write_binary(path, data)
+
+
+def read(path, mmap_mode=None):
+    """
+    Reads a session written in either the binary or the JSON format.
+
+    :param path: run file to read
+    :param mmap_mode: passed to numpy.memmap for binary files; None reads the
+                      column blocks into memory
+    :returns: dict of metadata values and per-run (columns, samples) arrays
+    """
+    if is_binary(path):
+        return read_binary(path, mmap_mode)
+    with open(path, "rb") as fp:
+        return read_json(fp)
+
+
+def write_binary(path, data):
+    metadata = {}
+    runs = {}
+    for key, value in data.items():
+        if _is_run(value):
+            runs[key] = _as_run(value)
+            if runs[key].ndim != 2:
+                raise ValueError(
+                    "Run %r must be two-dimensional, got shape %s"
+                    % (key, runs[key].shape)
+                )
+        else:
+            metadata[key] = value
+
+    # Offsets are relative to the start of the (aligned) data section so that
+    # they do not depend on the length of the header itself
+    columns = {}
+    offset = 0
+    for key, run in runs.items():
+        columns[key] = {"offset": offset, "shape": list(run.shape)}
+        offset = _align(offset + run.nbytes)
+
+    header = json.dumps({"metadata": metadata, "columns": columns}).encode("utf-8")
+    data_start = _align(_PREAMBLE.size + len(header))
+
+    with open(path, "wb") as fp:
+        fp.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        fp.write(header)
+        for key, run in runs.items():
+            fp.seek(data_start + columns[key]["offset"])
+            fp.write(np.ascontiguousarray(run).tobytes())
+        fp.truncate(data_start + offset)
+
+
+def read_binary(path, mmap_mode=None):
+    with open(path, "rb") as fp:
+        magic, version, header_len = _PREAMBLE.unpack(fp.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError("%s is not a characterization run file" % path)
+        if version > FORMAT_VERSION:
+            raise ValueError(
+                "%s was written by a newer version (format %d, expected <= %d)"
+                % (path, version, FORMAT_VERSION)
+            )
+        header = json.loads(fp.read(header_len).decode("utf-8"))
+
+        data_start = _align(_PREAMBLE.size + header_len)
+        data = dict(header["metadata"])
+        for key, column in header["columns"].items():
+            shape = tuple(column["shape"])
+            offset = data_start + column["offset"]
+            if mmap_mode is not None and 0 not in shape:
+                data[key] = np.memmap(
+                    path, dtype=_DTYPE, mode=mmap_mode, offset=offset, shape=shape
+                )
+            else:
+                fp.seek(offset)
+                data[key] = np.fromfile(
+                    fp, dtype=_DTYPE, count=int(np.prod(shape))
+                ).reshape(shape)
+
+    return data
+
+
+def write_json(path, data):
+    with open(path, "w") as fp:
+        json.dump(
+            {
+                key: np.transpose(value).tolist() if _is_run(value) else value
+                for key, value in data.items()
+            },
+            fp,
+            indent=4,
+            separators=(",", ": "),
+        )
+
+
+def read_json(fp):
+    data = json.load(fp)
+    # Transform the data into a numpy array to make it easier to use
+    # -> transpose it so we can deal with it in columns
+    for key, value in data.items():
+        if _is_run(value):
+            data[key] = _as_run(np.array(value, dtype=_DTYPE).transpose())
+    return data
@@ -9,12 +9,30 @@
 # - /robot/autospeed : This program sends this to the robot. In autonomous mode,
 #                      the robot should attempt to drive at this speed
 #
-# - /robot/telemetry : The robot sends this. It is a number array that contains:
-#                      - time, battery, autospeed,
+# - /robot/robotramp : This program sets this to true when the robot should
+#                      generate the test voltage itself.  In autonomous mode,
+#                      the robot should then drive at
+#                      (rampstart + ramprate * time in auto) / 12 instead of
+#                      autospeed
+#
+# - /robot/rampstart, /robot/ramprate : The initial voltage (V) and ramp rate
+#                      (V/s) of the test, sent before the robot is enabled
+#
+# - /robot/telemetry : The robot sends this while it runs a test, as a series of
+#                      number array chunks.  Each chunk contains:
+#                      - sequence number (starting at 0 for each test),
+#                        1 if this is the last chunk of the test else 0,
+#                      - followed by any number of samples, each of which is:
+#                        time, battery, autospeed,
 #                        lmotor_volts, rmotor_volts,
 #                        l_encoder_count, r_encoder_count,
-#                        l_encoder_velocity, r_encoder_velocity
+#                        l_encoder_velocity, r_encoder_velocity, gyro_angle
+#
+#                      Robot code that sends all samples at once when disabled,
+#                      as a single string of comma-separated values, is also
+#                      supported.
 
+import collections
 import logging
 import os
 import queue
@@ -24,11 +42,12 @@ import numpy as np
 from tkinter import messagebox, Checkbutton, Label
 from tkinter import StringVar, DoubleVar, BooleanVar
 
-from frc_characterization.newproject import Tests, Units
+from frc_characterization.constants import Tests, Units
 import frc_characterization.logger_gui as logger_gui
 from frc_characterization.logger_gui import Test
 
-from frc_characterization.logger_analyzer.data_analyzer import (
+from frc_characterization.logger_analyzer.columns import (
+    TIME_COL,
     AUTOSPEED_COL,
     L_ENCODER_P_COL,
     R_ENCODER_P_COL,
@@ -50,6 +69,25 @@ DS_ATTACHED_FIELD = 1 << 5
 timeout = 10
 num_columns = 10
 
+# Header of each telemetry chunk
+CHUNK_SEQUENCE_IDX = 0
+CHUNK_LAST_IDX = 1
+CHUNK_HEADER_LEN = 2
+
+# Period at which the commanded voltage is updated when the logger drives the
+# ramp itself
+ramp_period = 0.050
+
+# The robot is considered stationary once neither encoder position has moved
+# by more than stationary_tolerance over the last stationary_time seconds
+stationary_time = 1
+stationary_tolerance = 0.01
+
+# Number of telemetry samples the logger initially has room for in a single
+# test; at the 5ms period of the generated robot program this is about 5.5
+# minutes of data.  Longer tests grow the buffer.
+sample_buffer_capacity = 1 << 16
+
 
 def translate_control_word(value):
     value = int(value)
@@ -63,6 +101,72 @@ def translate_control_word(value):
         return "teleop"
 
 
+def parse_telemetry(telemetry):
+    """
+    Deserializes the telemetry string sent by the robot: "1, 2, ..., " ->
+    [[1, 2, ...], ...].  The string is parsed directly into a float array of
+    shape (samples, num_columns) without creating intermediate Python objects.
+    """
+    return np.fromstring(telemetry, sep=", ").reshape(-1, num_columns)
+
+
+class SampleBuffer:
+    """
+    Preallocated buffer of telemetry samples, written only by the
+    NetworkTables listener thread.  Chunks are copied straight into place as
+    they arrive, so receiving telemetry doesn't take any locks, and only
+    allocates when a long test outgrows the buffer; the test thread gets the
+    finished test through snapshot().
+    """
+
+    def __init__(self, capacity=sample_buffer_capacity, columns=num_columns):
+        self.rows = np.empty((capacity, columns))
+        # Number of samples written since the buffer was last cleared
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def extend(self, values, start=0):
+        """
+        Appends samples sent by the robot.
+
+        :param values: flat sequence of sample values, one row after another
+        :param start: index of the first sample value in values
+        :returns: the appended samples, shaped (samples, columns); this is a
+                  view of the buffer, so it is only valid until the buffer is
+                  cleared
+        """
+        columns = self.rows.shape[1]
+        size = len(values) - start
+        if size % columns:
+            raise ValueError(
+                "Received %d values, which isn't a whole number of samples" % size
+            )
+        n = size // columns
+
+        end = self.count + n
+        if end > len(self.rows):
+            # Double the capacity, so long tests only grow it a few times
+            rows = np.empty((max(end, 2 * len(self.rows)), columns))
+            rows[: self.count] = self.rows[: self.count]
+            self.rows = rows
+
+        self.rows.reshape(-1)[self.count * columns : end * columns] = values[start:]
+        samples = self.rows[self.count : end]
+        self.count = end
+        return samples
+
+    def snapshot(self):
+        """
+        :returns: a copy of the buffered samples, shaped (samples, columns)
+        """
+        return self.rows[: self.count].copy()
+
+
 class TestRunner:
 
     # Change this key to whatever NT key you want to log
@@ -74,6 +178,10 @@ class TestRunner:
     autospeed = ntproperty("/robot/autospeed", 0, writeDefault=True)
     rotate = ntproperty("/robot/rotate", False, writeDefault=False)
 
+    robot_ramp = ntproperty("/robot/robotramp", False, writeDefault=True)
+    ramp_start = ntproperty("/robot/rampstart", 0, writeDefault=True)
+    ramp_rate = ntproperty("/robot/ramprate", 0, writeDefault=True)
+
     def __init__(self, STATE):
 
         self.STATE = STATE
@@ -91,6 +199,25 @@ class TestRunner:
         self.data = []
         self.lock = threading.Condition()
 
+        # Telemetry samples received during the current test, and the
+        # finished test once the last chunk has been received
+        self.samples = SampleBuffer()
+        self.next_sequence = 0
+        self.telemetry = None
+
+        # (first time, last time, left min, left max, right min, right max)
+        # of each telemetry chunk received over the last stationary_time
+        # seconds; only tracked while wait_for_stationary is waiting
+        self.positions = collections.deque()
+        self.stationary = False
+        self.waiting_for_stationary = False
+
+        # (monotonic time the flush returned, commanded volts) of every
+        # autospeed update sent during the last ramp, and the number of update
+        # deadlines that were missed and skipped
+        self.command_times = []
+        self.skipped_deadlines = 0
+
         # Tells the listener to not store data
         self.discard_data = True
 
@@ -131,6 +258,13 @@ class TestRunner:
                 # it can be processed elsewhere
                 self.queue.put(data)
 
+                # Wake up anything waiting on the robot, see wait_for_stationary
+                with self.lock:
+                    self.lock.notifyAll()
+
+        elif key == self.log_key and not isinstance(value, str):
+            self.chunkReceived(value)
+
         elif key == self.log_key:
             logger.info("Data updated")
             self.last_data = value
@@ -148,6 +282,102 @@ class TestRunner:
                         value[AUTOSPEED_COL],
                     )
 
+    def chunkReceived(self, value):
+        # Called from the NetworkTables listener thread, which is the only
+        # writer of self.samples and self.positions; the lock is only taken
+        # to hand over a finished test or to wake up waiting threads
+        if len(value) < CHUNK_HEADER_LEN:
+            return
+
+        sequence = int(value[CHUNK_SEQUENCE_IDX])
+        if sequence == 0:
+            # The robot started a new test
+            self.positions.clear()
+
+        if len(value) > CHUNK_HEADER_LEN:
+            self.last_data = value[-num_columns:]
+
+        if self.discard_data:
+            if self.waiting_for_stationary and len(value) > CHUNK_HEADER_LEN:
+                self.updateStationary(
+                    np.reshape(value[CHUNK_HEADER_LEN:], (-1, num_columns))
+                )
+            return
+
+        if sequence == 0:
+            self.samples.clear()
+            self.next_sequence = 0
+
+        if sequence != self.next_sequence:
+            logger.warning(
+                "Expected telemetry chunk %d, received %d; %d chunks were lost",
+                self.next_sequence,
+                sequence,
+                sequence - self.next_sequence,
+            )
+        self.next_sequence = sequence + 1
+
+        samples = self.samples.extend(value, CHUNK_HEADER_LEN)
+        if self.waiting_for_stationary and len(samples):
+            self.updateStationary(samples)
+        last = bool(value[CHUNK_LAST_IDX])
+
+        logger.info(
+            "Received telemetry chunk %d (%d samples)%s",
+            sequence,
+            len(samples),
+            ", test complete" if last else "",
+        )
+
+        if last:
+            telemetry = self.samples.snapshot()
+            self.samples.clear()
+            with self.lock:
+                self.telemetry = telemetry
+                self.lock.notifyAll()
+
+    def updateStationary(self, samples):
+        """
+        Adds the range of the encoder positions of a newly received telemetry
+        chunk to the rolling window, and wakes up wait_for_stationary once the
+        robot has not moved for stationary_time seconds.
+        """
+        times = samples[:, TIME_COL]
+        l_encoder = samples[:, L_ENCODER_P_COL]
+        r_encoder = samples[:, R_ENCODER_P_COL]
+
+        chunks = self.positions
+        chunks.append(
+            (
+                times[0],
+                times[-1],
+                l_encoder.min(),
+                l_encoder.max(),
+                r_encoder.min(),
+                r_encoder.max(),
+            )
+        )
+
+        # Keep exactly one chunk starting at or before the start of the
+        # window, so we can tell whether the window is fully covered
+        newest = times[-1]
+        while len(chunks) > 1 and chunks[1][0] <= newest - stationary_time:
+            chunks.popleft()
+
+        if newest - chunks[0][0] < stationary_time:
+            self.stationary = False
+        else:
+            self.stationary = (
+                max(c[3] for c in chunks) - min(c[2] for c in chunks)
+                <= stationary_tolerance
+                and max(c[5] for c in chunks) - min(c[4] for c in chunks)
+                <= stationary_tolerance
+            )
+
+        if self.stationary:
+            with self.lock:
+                self.lock.notifyAll()
+
     def get_nowait(self, timeout=None):
         try:
             return self.queue.get(block=False, timeout=timeout)
@@ -158,72 +388,128 @@ class TestRunner:
         # Wait for the velocity to be 0 for at least one second
         logger.info("Waiting for robot to stop moving for at least 1 second...")
 
-        first_stationary_time = time.monotonic()
-        last_l_encoder = 0
-        last_r_encoder = 0
-
-        while True:
-            # check the queue in case we switched out of auto mode
-            qdata = self.get_nowait()
-            if qdata != queue.Empty:
-                return qdata
-
-            now = time.monotonic()
-
-            # check the encoder position values, are they stationary?
-            last_data = self.last_data
-
-            try:
-                l_encoder = last_data[L_ENCODER_P_COL]
-                r_encoder = last_data[R_ENCODER_P_COL]
-            except IndexError:
-                print(self.last_data)
-                raise
+        # The telemetry listener notifies us when the robot becomes
+        # stationary, or when the robot switches out of auto mode and the
+        # received data is put on the queue.  Positions from before the wait
+        # don't count, and nothing is tracked unless we are waiting.
+        self.positions.clear()
+        self.stationary = False
+        self.waiting_for_stationary = True
+        try:
+            with self.lock:
+                self.lock.wait_for(lambda: self.stationary or not self.queue.empty())
+        finally:
+            self.waiting_for_stationary = False
 
-            if (
-                abs(last_l_encoder - l_encoder) > 0.01
-                or abs(last_r_encoder - r_encoder) > 0.01
-            ):
-                first_stationary_time = now
-            elif now - first_stationary_time > 1:
-                logger.info("Robot has waited long enough, beginning test")
-                return
+        qdata = self.get_nowait()
+        if qdata != queue.Empty:
+            return qdata
 
-            last_l_encoder = l_encoder
-            last_r_encoder = r_encoder
+        logger.info("Robot has waited long enough, beginning test")
 
     def ramp_voltage_in_auto(self, initial_speed, ramp, rotate):
 
         logger.info(
-            "Activating robot at %.1f%%, adding %.3f per 50ms", initial_speed, ramp
+            "Activating robot at %.1fV, adding %.3fV per second", initial_speed, ramp
         )
 
         if rotate == None:
             rotate = self.STATE.angular_mode.get()
         self.rotate = rotate
-        self.discard_data = False
-        self.autospeed = initial_speed / 12
-        NetworkTables.flush()
+        self.command_times = []
+        self.skipped_deadlines = 0
 
-        try:
-            while True:
-                # check the queue in case we switched out of auto mode
-                qdata = self.get_nowait()
-                if qdata != queue.Empty:
-                    return qdata
+        if self.robot_ramp:
+            # The robot computes the voltage every loop from the parameters
+            # sent before the test; wait for it to leave auto mode
+            NetworkTables.flush()
+            return self.queue.get()
 
-                time.sleep(0.050)
-                self.autospeed = self.autospeed + (ramp * 0.05) / 12
+        # The commanded voltage is computed from the time elapsed since the
+        # start of the ramp, and updates are scheduled against fixed deadlines,
+        # so late wakeups or slow flushes don't slow the ramp down
+        start = time.monotonic()
+        deadline = start
 
+        try:
+            while True:
+                now = time.monotonic()
+                volts = initial_speed + ramp * (now - start)
+                self.autospeed = volts / 12
                 NetworkTables.flush()
+                now = time.monotonic()
+                self.command_times.append((now, volts))
+
+                # Skip any deadlines we already missed rather than sending a
+                # burst of updates to catch up
+                deadline += ramp_period
+                if deadline < now:
+                    missed = int((now - deadline) // ramp_period) + 1
+                    self.skipped_deadlines += missed
+                    deadline += missed * ramp_period
+
+                # wait for the next update, returning early if we switched
+                # out of auto mode
+                try:
+                    return self.queue.get(timeout=deadline - now)
+                except queue.Empty:
+                    pass
         finally:
             self.autospeed = 0
+            self.log_ramp_timing()
+
+    def log_ramp_timing(self):
+        """
+        Reports how regularly the autospeed updates of the last ramp were
+        sent.
+        """
+        if len(self.command_times) < 2:
+            return
+
+        times, _ = np.array(self.command_times).T
+        intervals = np.diff(times)
+
+        logger.info(
+            "Sent %d voltage updates: interval mean %.1fms, max %.1fms, "
+            "%d deadlines skipped",
+            len(times),
+            intervals.mean() * 1000,
+            intervals.max() * 1000,
+            self.skipped_deadlines,
+        )
+
+    def log_achieved_ramp(self, ramp, data):
+        """
+        Reports the ramp rate the robot actually applied, fitted to the
+        commanded voltage it recorded in the telemetry, next to the requested
+        rate.  This includes any delays between the logger and the robot.
+
+        :param data: telemetry of the test, shaped (samples, columns)
+        """
+        # Only the samples from the first to the last update of the ramp; the
+        # voltage is 0 before it reaches the robot and after the ramp ends
+        active = np.flatnonzero(data[:, AUTOSPEED_COL])
+        if len(active) < 2:
+            return
+        samples = data[active[0] : active[-1] + 1]
+        times = samples[:, TIME_COL]
+        if times[-1] <= times[0]:
+            return
+
+        achieved = np.polyfit(times, samples[:, AUTOSPEED_COL] * 12, 1)[0]
+        logger.info(
+            "Achieved ramp %.3fV/s (requested %.3fV/s)",
+            achieved,
+            ramp,
+        )
 
     def runTest(self, name, initial_speed, ramp, finished, rotate=None):
         try:
             # Initialize the robot commanded speed to 0
             self.autospeed = 0
             self.discard_data = True
+            with self.lock:
+                self.telemetry = None
             self.STATE.postTask(
                 lambda: messagebox.showinfo(
                     "Running " + name,
@@ -235,6 +521,21 @@ class TestRunner:
                 )
             )
 
+            # Send the test parameters ahead of time in case the robot
+            # generates the test voltage itself
+            self.ramp_start = initial_speed
+            self.ramp_rate = ramp
+            self.robot_ramp = self.STATE.robot_ramp.get()
+            NetworkTables.flush()
+
+            # Start accepting telemetry before the robot is enabled, so the
+            # first chunk isn't dropped if it arrives before we wake up.  The
+            # listener doesn't touch the buffer while data is discarded, so
+            # it is safe to reset it from here.
+            self.samples.clear()
+            self.next_sequence = 0
+            self.discard_data = False
+
             # Wait for robot to signal that it entered autonomous mode
             with self.lock:
                 self.lock.wait_for(lambda: self.mode == "auto")
@@ -253,13 +554,19 @@ class TestRunner:
             with self.lock:
                 self.lock.wait_for(lambda: self.mode == "disabled")
 
-            # tries to retrieve disabled data
+            # waits for the rest of the streamed telemetry, or for robot code
+            # that sends everything at once to send its data
             starttime = time.time()
-            while not self.data and time.time() - starttime < timeout:
+            while (
+                self.telemetry is None
+                and not self.data
+                and time.time() - starttime < timeout
+            ):
                 NetworkTables.flush()
-                time.sleep(0.1)
+                with self.lock:
+                    self.lock.wait(0.1)
 
-            if not self.data:
+            if self.telemetry is None and not self.data:
                 logger.info("could not receive data")
                 self.STATE.postTask(
                     lambda: messagebox.showerror(
@@ -271,14 +578,14 @@ class TestRunner:
                 return
             self.discard_data = True
 
-            # deserializes data: "1, 2, ..." -> [[1,2,...],...]
-            data = self.data[0].split(", ")  # turns the string sent into list
-            data = np.array(
-                [float(s) for s in data[0:-1]]
-            )  # turns the string values into floats
-            data = (
-                np.reshape(data, (-1, num_columns))
-            ).tolist()  # converts list to 2d array
+            if self.telemetry is not None:
+                with self.lock:
+                    data = self.telemetry
+                    self.telemetry = None
+            else:
+                data = parse_telemetry(self.data[0])
+
+            self.log_achieved_ramp(ramp, data)
 
             # output sanity check
             if len(data) < 3:
@@ -331,6 +638,7 @@ class TestRunner:
 
         finally:
             self.autospeed = 0
+            self.robot_ramp = False
             self.STATE.postTask(finished)
 
 
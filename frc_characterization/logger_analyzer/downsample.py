@@ -0,0 +1,132 @@
+# Downsampling of plotted data.  Long sessions have far more samples than can
+# be told apart on screen, and matplotlib gets slow to draw (and to pan) with
+# hundreds of thousands of points, so the diagnostic plots are thinned to a
+# point budget first.  Both methods keep the shape of the data: the peaks of
+# time series, and the outliers of scatter plots.  They only pick which points
+# are drawn; the fits always use every sample.  Points with non-finite
+# coordinates (such as the infinite acceleration of duplicate timestamps)
+# can't be drawn, and are never kept.
+
+import numpy as np
+
+
+def lttb(x, y, n):
+    """
+    Largest-triangle-three-buckets downsampling of a line (Steinarsson, 2013).
+    The first and last points are kept, and the rest are split into n - 2
+    buckets; from each bucket, the point forming the largest triangle with the
+    point kept from the previous bucket and the average of the next bucket is
+    kept.
+
+    :param x: x coordinates of the line
+    :param y: y coordinates of the line
+    :param n: number of points to keep (at least 3)
+    :returns: sorted indices of the points to keep
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    size = len(x)
+    n = max(n, 3)
+    if n >= size:
+        return np.arange(size)
+
+    # Buckets are [edges[i], edges[i + 1]); they are never empty as n < size
+    edges = np.linspace(1, size - 1, n - 1).astype(int)
+    counts = np.diff(edges)
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+    mean_x = (cx[edges[1:]] - cx[edges[:-1]]) / counts
+    mean_y = (cy[edges[1:]] - cy[edges[:-1]]) / counts
+
+    # The last bucket is followed by the last point
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    keep = np.empty(n, dtype=int)
+    keep[0] = 0
+    keep[-1] = size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Twice the area of each triangle
+        area = np.abs(
+            (x[a] - next_x[i]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (next_y[i] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def lttb_runs(x, y, n):
+    """
+    LTTB downsampling of a line that may be made of several runs, such as the
+    subsets combining several tests: the line is split wherever x decreases,
+    and each run is downsampled separately with its share of the budget.
+
+    :param x: x coordinates of the line
+    :param y: y coordinates of the line
+    :param n: number of points to keep; runs keep at least 3 points each
+    :returns: sorted indices of the points to keep
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    finite = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    if n >= len(finite):
+        return finite
+
+    x = x[finite]
+    starts = np.flatnonzero(np.r_[True, np.diff(x) < 0])
+    ends = np.r_[starts[1:], len(x)]
+    keep = []
+    for start, end in zip(starts, ends):
+        share = max(n * (end - start) // len(x), 3)
+        keep.append(start + lttb(x[start:end], y[finite[start:end]], share))
+    return finite[np.concatenate(keep)]
+
+
+def density_sample(coords, n, seed=0):
+    """
+    Thins a scatter plot by binning it on a grid and keeping at most the same
+    number of points from every cell, as many as the budget allows.  Sparse
+    regions and outliers are kept whole, and only dense regions are thinned.
+
+    :param coords: sequence of the coordinates of the points along each axis
+    :param n: largest number of points to keep
+    :param seed: seed of the random choice of the points kept in a cell
+    :returns: sorted indices of the points to keep
+    """
+    coords = [np.asarray(c, dtype=float) for c in coords]
+    finite = np.flatnonzero(np.logical_and.reduce([np.isfinite(c) for c in coords]))
+    size = len(finite)
+    if n >= size:
+        return finite
+    coords = [c[finite] for c in coords]
+
+    # Use no more cells than points in the budget, so every occupied cell
+    # keeps at least one point
+    bins = max(int(n ** (1 / len(coords))), 1)
+    cell = np.zeros(size, dtype=np.int64)
+    for c in coords:
+        lo, hi = np.min(c), np.max(c)
+        scale = bins / (hi - lo) if hi > lo else 0.0
+        cell = cell * bins + np.minimum(((c - lo) * scale).astype(np.int64), bins - 1)
+
+    # Sort by cell, in random order within each cell
+    rank = np.random.default_rng(seed).permutation(size)
+    order = np.argsort(cell * size + rank)
+    sorted_cell = cell[order]
+    starts = np.flatnonzero(np.r_[True, sorted_cell[1:] != sorted_cell[:-1]])
+    counts = np.diff(np.r_[starts, size])
+
+    # Largest number of points per cell that fits in the budget
+    lo, hi = 1, int(counts.max())
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if np.minimum(counts, mid).sum() <= n:
+            lo = mid
+        else:
+            hi = mid - 1
+
+    position = np.arange(size) - np.repeat(starts, counts)
+    return finite[np.sort(order[position < lo])]
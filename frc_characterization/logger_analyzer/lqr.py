@@ -0,0 +1,208 @@
+# Linear-quadratic regulators for the models used by the gain calculation.
+#
+# The feedback gains are computed for a one-state (velocity) or two-state
+# (position) model of the mechanism.  Systems this small can be discretized
+# in closed form, and their discrete algebraic Riccati equation (DARE) solved
+# directly with NumPy, which is much cheaper than building, discretizing and
+# solving a general state-space system.
+#
+# Every function accepts stacks of systems: matrices have shape (..., n, n)
+# and model parameters may be arrays, so many gains can be computed at once.
+
+import numpy as np
+
+# Largest number of doubling steps taken to solve the DARE; each step doubles
+# the horizon, so this is never reached by a stabilizable system
+MAX_DOUBLING_STEPS = 64
+
+
+def _phi1(x):
+    # (e^x - 1) / x, continuous at 0
+    small = np.abs(x) < 1e-8
+    safe = np.where(small, 1.0, x)
+    return np.where(small, 1.0 + x / 2, np.expm1(safe) / safe)
+
+
+def _phi2(x):
+    # (e^x - 1 - x) / x^2, continuous at 0; the series avoids the
+    # cancellation of the direct formula for small x
+    small = np.abs(x) < 1e-2
+    safe = np.where(small, 1.0, x)
+    series = 1 / 2 + x * (1 / 6 + x * (1 / 24 + x * (1 / 120 + x / 720)))
+    return np.where(small, series, (np.expm1(safe) - safe) / np.square(safe))
+
+
+def discretize_velocity(kv, ka, period):
+    """
+    Zero-order hold discretization of the velocity model of the mechanism,
+    dv/dt = -kv/ka v + 1/ka u.
+
+    :returns: (A, B), each of shape (..., 1, 1)
+    """
+    kv, ka, period = np.broadcast_arrays(
+        *(np.asarray(v, float) for v in (kv, ka, period))
+    )
+    x = -kv / ka * period
+    A = np.exp(x)
+    B = period * _phi1(x) / ka
+    return A[..., np.newaxis, np.newaxis], B[..., np.newaxis, np.newaxis]
+
+
+def position_coefficients(kv, ka, period):
+    """
+    The elements of the discretized position model (see discretize_position)
+    that aren't constant, for when the matrices themselves aren't needed.
+
+    :returns: (A01, A11, B0, B1) arrays
+    """
+    kv, ka, period = np.broadcast_arrays(
+        *(np.asarray(v, float) for v in (kv, ka, period))
+    )
+    x = -kv / ka * period
+    phi1 = _phi1(x)
+    return (
+        period * phi1,
+        np.exp(x),
+        np.square(period) * _phi2(x) / ka,
+        period * phi1 / ka,
+    )
+
+
+def discretize_position(kv, ka, period):
+    """
+    Zero-order hold discretization of the position model of the mechanism,
+    whose state is [position, velocity].
+
+    :returns: (A, B), of shapes (..., 2, 2) and (..., 2, 1)
+    """
+    a01, a11, b0, b1 = position_coefficients(kv, ka, period)
+
+    A = np.zeros(a01.shape + (2, 2))
+    A[..., 0, 0] = 1
+    A[..., 0, 1] = a01
+    A[..., 1, 1] = a11
+
+    B = np.stack((b0, b1), axis=-1)[..., np.newaxis]
+    return A, B
+
+
+def dare(A, B, Q, R):
+    """
+    Solves the discrete algebraic Riccati equation
+
+      P = A^T P A - A^T P B (R + B^T P B)^-1 B^T P A + Q
+
+    of a single-input system with one or two states: in closed form for one
+    state, and with the structure-preserving doubling algorithm for two.
+
+    :returns: P
+    """
+    A, B, Q, R = (np.asarray(m, dtype=float) for m in (A, B, Q, R))
+    if B.shape[-1] != 1 or A.shape[-1] not in (1, 2):
+        raise ValueError(
+            "Only single-input systems with one or two states are supported"
+        )
+    if A.shape[-1] == 1:
+        return _dare_scalar(A, B, Q, R)
+    return _dare_2x2(A, B, Q, R)
+
+
+def _dare_scalar(A, B, Q, R):
+    # The DARE is the quadratic b^2 p^2 + c p - q r = 0; this takes its
+    # positive root in the form that doesn't suffer from cancellation
+    a, b, q, r = (m[..., 0, 0] for m in (A, B, Q, R))
+    c = r * (1 - np.square(a)) - q * np.square(b)
+    root = np.sqrt(np.square(c) + 4 * np.square(b) * q * r)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = np.where(c > 0, 2 * q * r / (c + root), (root - c) / (2 * np.square(b)))
+    return p[..., np.newaxis, np.newaxis]
+
+
+# 2x2 matrices are handled as ((m00, m01), (m10, m11)), where each element is
+# a number or an array of the elements of a stack of matrices.  Spelling out
+# the products avoids the overhead of NumPy's linear algebra on tiny matrices.
+
+
+def _split(m):
+    if m.ndim == 2:
+        # A single matrix is much faster to work with as plain floats
+        return tuple(tuple(row) for row in m.tolist())
+    rows, cols = m.shape[-2:]
+    return tuple(tuple(m[..., i, j] for j in range(cols)) for i in range(rows))
+
+
+def _max_abs(x):
+    return np.max(np.abs(x)) if isinstance(x, np.ndarray) else abs(x)
+
+
+def _add(x, y):
+    return (
+        (x[0][0] + y[0][0], x[0][1] + y[0][1]),
+        (x[1][0] + y[1][0], x[1][1] + y[1][1]),
+    )
+
+
+def _mul(x, y):
+    (x00, x01), (x10, x11) = x
+    (y00, y01), (y10, y11) = y
+    return (
+        (x00 * y00 + x01 * y10, x00 * y01 + x01 * y11),
+        (x10 * y00 + x11 * y10, x10 * y01 + x11 * y11),
+    )
+
+
+def _transpose(x):
+    return ((x[0][0], x[1][0]), (x[0][1], x[1][1]))
+
+
+def _inv(x):
+    det = x[0][0] * x[1][1] - x[0][1] * x[1][0]
+    return ((x[1][1] / det, -x[0][1] / det), (-x[1][0] / det, x[0][0] / det))
+
+
+def _dare_2x2(A, B, Q, R):
+    # Structure-preserving doubling algorithm: after k steps, H is the cost
+    # of a horizon of 2^k steps, so it converges quadratically to P.  I + GH
+    # always has positive eigenvalues, so it is safe to invert, and H stays
+    # symmetric, so only its upper triangle is checked for convergence.
+    ((r,),) = _split(R)
+    (b0,), (b1,) = _split(B)
+    G = ((b0 * b0 / r, b0 * b1 / r), (b1 * b0 / r, b1 * b1 / r))
+    H = _split(Q)
+    A = _split(A)
+    identity = ((1.0, 0.0), (0.0, 1.0))
+
+    for _ in range(MAX_DOUBLING_STEPS):
+        W = _inv(_add(identity, _mul(G, H)))
+        WA = _mul(W, A)
+        H_next = _add(H, _mul(_mul(_transpose(A), H), WA))
+        G = _add(G, _mul(_mul(A, _mul(W, G)), _transpose(A)))
+        A = _mul(A, WA)
+
+        change = max(_max_abs(a - b) for a, b in zip(H_next[0], H[0]))
+        change = max(change, _max_abs(H_next[1][1] - H[1][1]))
+        H = H_next
+        scale = max(_max_abs(h) for h in (H[0][0], H[0][1], H[1][1]))
+        if change <= 1e-14 * scale:
+            return np.stack(
+                [np.stack(np.broadcast_arrays(*row), axis=-1) for row in H], axis=-2
+            )
+
+    raise np.linalg.LinAlgError("The Riccati equation did not converge")
+
+
+def lqr(A, B, Q, R):
+    """
+    Computes the gain of the discrete-time linear-quadratic regulator of a
+    system, u = -K x.
+
+    :param A: discrete system matrix
+    :param B: discrete input matrix
+    :param Q: state cost matrix
+    :param R: input cost matrix
+    :returns: K
+    """
+    A, B, Q, R = (np.asarray(m, dtype=float) for m in (A, B, Q, R))
+    P = dare(A, B, Q, R)
+    BtP = np.swapaxes(B, -1, -2) @ P
+    return np.linalg.solve(R + BtP @ B, BtP @ A)
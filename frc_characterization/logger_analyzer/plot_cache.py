@@ -0,0 +1,131 @@
+# Figures of the analyzer that are kept between redraws.  Plotting the same
+# diagnostics again (after changing the subset's fit or trim settings) updates
+# the data of the existing artists instead of building a new figure, so
+# re-analyzing doesn't pile up figures and axes.  When an update leaves the
+# axes limits as they were, only the artists are redrawn, over a saved copy of
+# the rest of the figure (blitting).
+#
+# Only the analyzer imports this, after pyplot has been set up.
+
+import numpy as np
+
+
+def rescale(ax, *points):
+    """
+    Fits the limits of 2D axes to new data.
+
+    :param points: (x, y) arrays of everything plotted on the axes
+    """
+    ax.ignore_existing_data_limits = True
+    for x, y in points:
+        if len(x):
+            ax.update_datalim(np.column_stack((x, y)))
+    ax.autoscale_view()
+
+
+class CachedFigure:
+    """
+    A figure, and the artists showing its data, whose data is updated in
+    place when the figure is shown again.
+    """
+
+    def __init__(self, fig, artists, blit=True):
+        """
+        :param fig: the figure
+        :param artists: list of the artists whose data changes
+        :param blit: whether the artists can be redrawn on their own; this
+                     doesn't work for 3D axes, which project all artists
+                     together
+        """
+        self.fig = fig
+        self.artists = artists
+        self.blit = blit
+        self._background = None
+        self._limits = None
+
+        # Any other redraw (panning, zooming, resizing) makes the saved
+        # background stale
+        fig.canvas.mpl_connect("draw_event", self._forget_background)
+
+    def _forget_background(self, event):
+        self._background = None
+
+    def _view_limits(self):
+        return [
+            (ax.get_xlim(), ax.get_ylim(), getattr(ax, "get_zlim", tuple)())
+            for ax in self.fig.axes
+        ]
+
+    def redraw(self):
+        """
+        Redraws the figure after its artists were updated.
+        """
+        canvas = self.fig.canvas
+        limits = self._view_limits()
+        if self._background is not None and limits == self._limits:
+            canvas.restore_region(self._background)
+            for artist in self.artists:
+                artist.axes.draw_artist(artist)
+            canvas.blit(self.fig.bbox)
+            return
+
+        if not (self.blit and canvas.supports_blit):
+            canvas.draw_idle()
+            return
+
+        # Draw everything but the artists first, to save as the background of
+        # later updates
+        for artist in self.artists:
+            artist.set_visible(False)
+        canvas.draw()
+        self._background = canvas.copy_from_bbox(self.fig.bbox)
+        self._limits = limits
+        for artist in self.artists:
+            artist.set_visible(True)
+            artist.axes.draw_artist(artist)
+        canvas.blit(self.fig.bbox)
+
+
+class FigureCache:
+    """
+    The open figures of the analyzer, by title.
+    """
+
+    def __init__(self):
+        self.figures = {}
+
+    def get(self, title):
+        """
+        :returns: the CachedFigure with the title, or None if there is none or
+                  it has been closed
+        """
+        cached = self.figures.get(title)
+        if cached is None:
+            return None
+
+        from matplotlib import pyplot as plt
+
+        if not plt.fignum_exists(cached.fig.number):
+            del self.figures[title]
+            return None
+        return cached
+
+    def add(self, title, fig, artists, blit=True):
+        """
+        Keeps a new figure; see CachedFigure.
+
+        :returns: the CachedFigure
+        """
+        cached = self.figures[title] = CachedFigure(fig, artists, blit)
+        return cached
+
+    def close_all(self):
+        """Closes every figure"""
+        if not self.figures:
+            return
+
+        from matplotlib import pyplot as plt
+
+        for cached in self.figures.values():
+            plt.close(cached.fig)
+        self.figures.clear()
@@ -0,0 +1,162 @@
+# A cache of prepared data, so that analyzing the same data with the same
+# settings again (e.g. to look at another subset, or after going back to a
+# previous window size) doesn't prepare it from scratch.
+#
+# Prepared data is keyed by a hash of the contents of the session and by every
+# setting prepare_data depends on.  The most recently used datasets are kept in
+# memory; if a directory is given, the prepared data is also saved there in
+# the binary run format, so they survive reopening the session in a new
+# analyzer and are memory-mapped when they are read back.  Cache files are
+# never removed automatically; the directory can be deleted at any time.
+
+import collections
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+from frc_characterization.constants import Tests, Units
+from frc_characterization.logger_analyzer import analysis, data_file
+
+logger = logging.getLogger("logger")
+
+# Change this whenever prepare_data changes its results, so that files written
+# by older versions aren't used
+CACHE_VERSION = 2
+
+
+def data_digest(data):
+    """
+    :param data: dict of metadata values and per-run (columns, samples) arrays
+    :returns: hash of the contents of the session, as a hex string
+    """
+    digest = hashlib.sha256()
+    for key in sorted(data):
+        value = data[key]
+        digest.update(key.encode("utf-8"))
+        if isinstance(value, np.ndarray):
+            value = np.ascontiguousarray(value, dtype="<f8")
+            digest.update(repr(value.shape).encode("utf-8"))
+            digest.update(memoryview(value).cast("B"))
+        else:
+            digest.update(json.dumps(value).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class PreparedCache:
+    """
+    LRU cache of the results of analysis.prepare_data.
+    """
+
+    def __init__(self, maxsize=8, directory=None):
+        """
+        :param maxsize: number of prepared datasets kept in memory
+        :param directory: directory to also keep prepared data in, or None
+        """
+        self.maxsize = maxsize
+        self.directory = directory
+        self.entries = collections.OrderedDict()
+
+    def prepare_data(
+        self,
+        data,
+        test,
+        window,
+        motion_threshold,
+        units,
+        units_per_rot,
+        digest=None,
+    ):
+        """
+        Returns the prepared data for the given settings, preparing it only if
+        it isn't cached.  The parameters are those of analysis.prepare_data.
+
+        The prepared data is shared between calls, so it is read-only.
+
+        :param digest: data_digest(data), if it is already known
+        :returns: analysis.PreparedData
+        """
+        test = Tests(test)
+        key = (
+            digest or data_digest(data),
+            test.value,
+            int(window),
+            float(motion_threshold),
+            Units(units).value,
+            float(units_per_rot),
+        )
+
+        prepared = self.entries.get(key)
+        if prepared is not None:
+            self.entries.move_to_end(key)
+            return prepared
+
+        prepared = self._load(key, test)
+        if prepared is None:
+            prepared = analysis.prepare_data(
+                data, test, window, motion_threshold, units, units_per_rot
+            )
+            self._save(key, prepared)
+
+        prepared.quasi.flags.writeable = False
+        prepared.step.flags.writeable = False
+
+        if self.maxsize > 0:
+            self.entries[key] = prepared
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+        return prepared
+
+    def clear(self):
+        """Forgets the prepared data kept in memory"""
+        self.entries.clear()
+
+    def _path(self, key):
+        name = hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name + data_file.BINARY_EXTENSION)
+
+    def _load(self, key, test):
+        if self.directory is None:
+            return None
+
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            cached = data_file.read_binary(path, mmap_mode="r")
+            if cached.get("cacheVersion") != CACHE_VERSION:
+                return None
+            return analysis.PreparedData(
+                test, cached["quasi"], cached["step"], cached["lengths"]
+            )
+        except Exception as e:
+            # A broken file is just a cache miss; it will be overwritten
+            logger.warning("Ignoring cached data %s: %r", path, e)
+            return None
+
+    def _save(self, key, prepared):
+        if self.directory is None:
+            return
+
+        path = self._path(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+
+            # Write to a temporary file first, so that an interrupted write
+            # doesn't leave a broken file behind
+            tmp_path = "%s.%d.tmp" % (path, os.getpid())
+            data_file.write_binary(
+                tmp_path,
+                {
+                    "cacheVersion": CACHE_VERSION,
+                    "quasi": prepared.quasi,
+                    "step": prepared.step,
+                    "lengths": prepared.lengths,
+                },
+            )
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not cache prepared data in %s: %r", path, e)
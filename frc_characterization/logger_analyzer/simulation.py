@@ -0,0 +1,292 @@
+# Closed-loop simulation of the fitted mechanism, to check feedback gains
+# before they are deployed.
+#
+# The mechanism follows the feedforward model fitted by the analyzer,
+#
+#   V = kS sgn(v) + kV v + kA a + kG + kCos cos(angle)
+#
+# and is driven by a controller that runs once per controller period, sees
+# measurements that are a whole number of periods old, and saturates at the
+# battery voltage.  The voltage is held between controller updates, so the
+# linear part of the model advances exactly with the zero-order hold
+# discretization also used for the gains (lqr.discretize_position); friction
+# and gravity are held over each period too.
+#
+# The model and gain parameters may be arrays, so many gain candidates (or
+# plants) are simulated at once; the only Python loop is over time.
+
+import numpy as np
+from frc_characterization.logger_analyzer import analysis, lqr
+
+# Voltage of a fully saturated controller output; this is what
+# max_controller_output corresponds to in calc_gains
+MAX_VOLTAGE = 12
+
+# Smaller values of kA are replaced by this, which makes the velocity follow
+# the voltage within a period without dividing by zero
+MIN_KA = 1e-9
+
+
+def step_reference(size, duration, period, loop_type="Velocity"):
+    """
+    :param size: size of the step, in units for position loops and units/s for
+                 velocity loops
+    :param duration: length of the reference (s)
+    :param period: period of the control loop (s)
+    :returns: (position, velocity, acceleration) reference, one value per
+              period.  The position isn't used by velocity loops.
+    """
+    steps = int(round(duration / period))
+    step = np.full(steps, float(size))
+    zeros = np.zeros(steps)
+    if loop_type == "Position":
+        return step, zeros, zeros
+    return zeros, step, zeros
+
+
+def trapezoid_profile(distance, max_velocity, max_acceleration, period, duration=None):
+    """
+    Motion profile that accelerates at max_acceleration up to max_velocity and
+    decelerates to stop at distance.
+
+    :param duration: length of the reference (s); defaults to the length of
+                     the profile
+    :returns: (position, velocity, acceleration) reference, one value per
+              period
+    """
+    sign = np.sign(distance)
+    distance = abs(distance)
+
+    accel_time = max_velocity / max_acceleration
+    if max_acceleration * accel_time**2 > distance:
+        # Never reaches max_velocity
+        accel_time = np.sqrt(distance / max_acceleration)
+    peak_velocity = max_acceleration * accel_time
+    cruise_time = (distance - max_acceleration * accel_time**2) / peak_velocity
+    total_time = 2 * accel_time + cruise_time
+
+    if duration is None:
+        duration = total_time
+    t = np.arange(int(np.ceil(duration / period)) + 1) * period
+    remaining = total_time - t
+
+    phases = [t < accel_time, t < accel_time + cruise_time, t < total_time]
+    position = np.select(
+        phases,
+        [
+            max_acceleration * np.square(t) / 2,
+            peak_velocity * (t - accel_time / 2),
+            distance - max_acceleration * np.square(remaining) / 2,
+        ],
+        distance,
+    )
+    velocity = np.select(
+        phases, [max_acceleration * t, peak_velocity, max_acceleration * remaining], 0
+    )
+    acceleration = np.select(phases, [max_acceleration, 0, -max_acceleration], 0)
+    return sign * position, sign * velocity, sign * acceleration
+
+
+def simulate(
+    reference,
+    kp,
+    kd,
+    kv,
+    ka,
+    ks=0,
+    kg=0,
+    kcos=0,
+    loop_type="Velocity",
+    period=0.02,
+    measurement_delay=0,
+    units=None,
+    feedforward=True,
+    max_voltage=MAX_VOLTAGE,
+):
+    """
+    Simulates the mechanism under feedback control, starting at rest at
+    position 0.  The gain and model parameters may be arrays, which are
+    broadcast against each other to give the batch of systems simulated.
+
+    The gains are in volts, with kD per second: those of calc_gains with
+    max_controller_output=12 and time_normalized=True.  As in WPILib's
+    PIDController, the derivative is taken of the error.
+
+    :param reference: (position, velocity, acceleration) arrays with one value
+                      per period, as from step_reference or trapezoid_profile
+    :param loop_type: "Position" or "Velocity"
+    :param period: period of the control loop (s)
+    :param measurement_delay: measurement delay of the sensor (ms), rounded to
+                              whole periods as in calc_gains
+    :param units: the Units value of the position; only needed with kcos
+    :param feedforward: whether the controller adds the feedforward voltage of
+                        the reference
+    :param max_voltage: voltage the output saturates at
+    :returns: dict of "time" (s), and the "position", "velocity", "voltage"
+              and "saturated" (bool) arrays of each system, with time along
+              the last axis
+    """
+    ref_pos, ref_vel, ref_acc = (np.asarray(r, dtype=float) for r in reference)
+    kp, kd, kv, ka, ks, kg, kcos = np.broadcast_arrays(
+        *(np.asarray(v, dtype=float) for v in (kp, kd, kv, ka, ks, kg, kcos))
+    )
+    # np.broadcast_shapes needs NumPy 1.20; this also works for empty
+    # references
+    shape = np.broadcast(kp[..., np.newaxis], ref_pos[..., :1]).shape[:-1]
+    steps = ref_pos.shape[-1]
+    delay = int(round(measurement_delay / 1000 / period))
+
+    if np.any(kcos != 0) and units is None:
+        raise ValueError("The units of the position are needed to simulate an arm")
+
+    def gravity(position):
+        if np.any(kcos != 0):
+            return kg + kcos * np.cos(analysis.arm_angle(position, units))
+        return kg
+
+    a01, a11, b0, b1 = lqr.position_coefficients(kv, np.maximum(ka, MIN_KA), period)
+    friction_limit = np.abs(ks)
+
+    position = np.zeros(shape + (steps,))
+    velocity = np.zeros(shape + (steps,))
+    voltage = np.zeros(shape + (steps,))
+    saturated = np.zeros(shape + (steps,), dtype=bool)
+
+    p = np.zeros(shape)
+    v = np.zeros(shape)
+    previous_error = None
+    for k in range(steps):
+        position[..., k] = p
+        velocity[..., k] = v
+
+        # Controller update, with measurements from `delay` periods ago
+        measured = max(k - delay, 0)
+        if loop_type == "Position":
+            error = ref_pos[..., k] - position[..., measured]
+        else:
+            error = ref_vel[..., k] - velocity[..., measured]
+        if previous_error is None:
+            previous_error = error
+        u = kp * error + kd * (error - previous_error) / period
+        previous_error = error
+
+        if feedforward:
+            u = u + (
+                ks * np.sign(ref_vel[..., k])
+                + kv * ref_vel[..., k]
+                + ka * ref_acc[..., k]
+                + gravity(
+                    ref_pos[..., k]
+                    if loop_type == "Position"
+                    else position[..., measured]
+                )
+            )
+
+        saturated[..., k] = np.abs(u) >= max_voltage
+        volts = voltage[..., k] = np.clip(u, -max_voltage, max_voltage)
+
+        # Plant update.  At rest, static friction cancels the rest of the
+        # voltage up to kS; in motion it opposes the motion, and can stop the
+        # mechanism but not reverse it.
+        drive = volts - gravity(p)
+        friction = np.where(
+            v == 0,
+            np.clip(drive, -friction_limit, friction_limit),
+            friction_limit * np.sign(v),
+        )
+        force = drive - friction
+        p = p + a01 * v + b0 * force
+        next_v = a11 * v + b1 * force
+        v = np.where(np.sign(next_v) == -np.sign(v), 0.0, next_v)
+
+    return {
+        "time": np.arange(steps) * period,
+        "position": position,
+        "velocity": velocity,
+        "voltage": voltage,
+        "saturated": saturated,
+    }
+
+
+def _output(result, loop_type):
+    return result["position" if loop_type == "Position" else "velocity"]
+
+
+def step_metrics(result, size, loop_type="Velocity"):
+    """
+    :param result: the result of simulate for a step_reference
+    :param size: size of the step
+    :returns: dict of arrays of the "rise_time" from 10% to 90% of the step
+              (s, NaN if it isn't reached), the "overshoot" past the step and
+              the "final_error", as fractions of the step, and the fraction
+              of the time the output was "saturated"
+    """
+    y = _output(result, loop_type) / size
+    t = result["time"]
+
+    def first_time(reached):
+        return np.where(reached.any(axis=-1), t[np.argmax(reached, axis=-1)], np.nan)
+
+    return {
+        "rise_time": first_time(y >= 0.9) - first_time(y >= 0.1),
+        "overshoot": np.maximum(np.max(y, axis=-1) - 1, 0),
+        "final_error": np.abs(1 - y[..., -1]),
+        "saturation": np.mean(result["saturated"], axis=-1),
+    }
+
+
+def tracking_metrics(result, reference, loop_type="Velocity"):
+    """
+    :param result: the result of simulate
+    :param reference: the reference given to simulate
+    :returns: dict of arrays of the "rms_error" and "max_error" from the
+              reference, and the fraction of the time the output was
+              "saturated"
+    """
+    ref_pos, ref_vel, _ = reference
+    error = _output(result, loop_type) - (
+        ref_pos if loop_type == "Position" else ref_vel
+    )
+    return {
+        "rms_error": np.sqrt(np.mean(np.square(error), axis=-1)),
+        "max_error": np.max(np.abs(error), axis=-1),
+        "saturation": np.mean(result["saturated"], axis=-1),
+    }
+
+
+def step_response(
+    size, duration, kp, kd, kv, ka, period=0.02, measurement_delay=0, **kwargs
+):
+    """
+    Simulates a step response and computes its step_metrics.  Unlike simulate,
+    period and measurement_delay may also be arrays; systems with the same
+    period and delay are simulated together.
+
+    :param kwargs: passed to simulate
+    :returns: the step_metrics of each system
+    """
+    loop_type = kwargs.get("loop_type", "Velocity")
+    params = np.broadcast_arrays(
+        *(
+            np.asarray(v, dtype=float)
+            for v in (kp, kd, kv, ka, period, measurement_delay)
+        )
+    )
+    period, delay = params[-2:]
+
+    metrics = {}
+    for p, d in sorted(set(zip(period.ravel().tolist(), delay.ravel().tolist()))):
+        idx = (period == p) & (delay == d)
+        result = simulate(
+            step_reference(size, duration, p, loop_type),
+            *(v[idx] for v in params[:4]),
+            period=p,
+            measurement_delay=d,
+            **{
+                k: np.broadcast_to(v, period.shape)[idx] if np.ndim(v) else v
+                for k, v in kwargs.items()
+            },
+        )
+        for name, value in step_metrics(result, size, loop_type).items():
+            metrics.setdefault(name, np.full(period.shape, np.nan))[idx] = value
+    return metrics
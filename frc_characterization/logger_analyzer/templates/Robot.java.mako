@@ -7,7 +7,7 @@
 
 package dc;
 
-import java.util.function.Supplier;
+import java.util.function.DoubleSupplier;
 
 import com.ctre.phoenix.motorcontrol.can.WPI_TalonSRX;
 import com.ctre.phoenix.motorcontrol.can.WPI_VictorSPX;
@@ -80,24 +80,42 @@ public class Robot extends TimedRobot {
   % endif
 
 
-  Supplier<Double> leftEncoderPosition;
-  Supplier<Double> leftEncoderRate;
-  Supplier<Double> rightEncoderPosition;
-  Supplier<Double> rightEncoderRate;
-  Supplier<Double> gyroAngleRadians;
+  DoubleSupplier leftEncoderPosition;
+  DoubleSupplier leftEncoderRate;
+  DoubleSupplier rightEncoderPosition;
+  DoubleSupplier rightEncoderRate;
+  DoubleSupplier gyroAngleRadians;
 
   NetworkTableEntry autoSpeedEntry = NetworkTableInstance.getDefault().getEntry("/robot/autospeed");
   NetworkTableEntry telemetryEntry = NetworkTableInstance.getDefault().getEntry("/robot/telemetry");
   NetworkTableEntry rotateEntry = NetworkTableInstance.getDefault().getEntry("/robot/rotate");
-
-  String data = "";
-  
+  NetworkTableEntry robotRampEntry = NetworkTableInstance.getDefault().getEntry("/robot/robotramp");
+  NetworkTableEntry rampStartEntry = NetworkTableInstance.getDefault().getEntry("/robot/rampstart");
+  NetworkTableEntry rampRateEntry = NetworkTableInstance.getDefault().getEntry("/robot/ramprate");
+
+  // Telemetry is streamed to the data logger in chunks of this many samples
+  // while a test runs; each chunk is prefixed by a sequence number and a flag
+  // marking the last chunk of the test
+  static private int CHUNK_SAMPLES = 50;
+  static private int CHUNK_HEADER_LENGTH = 2;
+  static private int NUM_COLUMNS = 10;
+  static private double MIN_PUBLISH_PERIOD = 0.02;
+
+  // Samples are recorded into a preallocated ring buffer that holds this many
+  // samples, so that logging does not allocate; samples that are not sent
+  // before the buffer wraps around are lost
+  static private int BUFFER_SAMPLES = ${context.get("telemetryBufferSamples", 2000)};
+
+  double[] buffer = new double[BUFFER_SAMPLES * NUM_COLUMNS];
+  double[] chunk = new double[CHUNK_HEADER_LENGTH + CHUNK_SAMPLES * NUM_COLUMNS];
+  // Total number of samples recorded and sent during the current test
   int counter = 0;
+  int sent = 0;
+  int chunkSequence = 0;
+  boolean flushing = false;
+  double lastPublishTime = 0;
   double startTime = 0;
   double priorAutospeed = 0;
-
-  double[] numberArray = new double[10];
-  ArrayList<Double> entries = new ArrayList<Double>();
   public Robot() {
     super(.005);
     LiveWindow.disableAllTelemetry();
@@ -348,9 +366,8 @@ public class Robot extends TimedRobot {
     % elif gyroType == "Pigeon":
     // Uncomment for Pigeon
     PigeonIMU pigeon = new PigeonIMU(${gyroPort});
+    double[] xyz = new double[3];
     gyroAngleRadians = () -> {
-      // Allocating a new array every loop is bad but concise
-      double[] xyz = new double[3];
       pigeon.getAccumGyro(xyz);
       return Math.toRadians(xyz[2]);
     };
@@ -372,27 +389,75 @@ public class Robot extends TimedRobot {
     % else:
     leaderMotor.set(0);
     % endif
-    // data processing step
-    data = entries.toString();
-    data = data.substring(1, data.length() - 1) + ", ";
-    telemetryEntry.setString(data);
-    entries.clear();
+    // send whatever is left of the test
+    flushing = true;
+    publishTelemetry();
     System.out.println("Robot disabled");
     System.out.println("Collected : " + counter + " in " + elapsedTime + " seconds");
-    data = "";
+  }
+
+  /**
+  * Publishes up to CHUNK_SAMPLES unsent samples as one telemetry chunk. Full
+  * chunks reuse a preallocated array; only the last chunk of a test, which is
+  * usually shorter, is allocated.
+  */
+  public void sendTelemetryChunk(boolean last) {
+    if (counter - sent > BUFFER_SAMPLES) {
+      System.out.println("Telemetry buffer overflowed, dropped "
+          + (counter - sent - BUFFER_SAMPLES) + " samples");
+      sent = counter - BUFFER_SAMPLES;
+    }
+
+    int samples = Math.min(counter - sent, CHUNK_SAMPLES);
+    double[] out = samples == CHUNK_SAMPLES
+        ? chunk : new double[CHUNK_HEADER_LENGTH + samples * NUM_COLUMNS];
+    out[0] = chunkSequence++;
+    out[1] = last ? 1 : 0;
+
+    // copy the samples out of the ring buffer, which may wrap around once
+    int start = sent % BUFFER_SAMPLES;
+    int first = Math.min(samples, BUFFER_SAMPLES - start);
+    System.arraycopy(buffer, start * NUM_COLUMNS, out, CHUNK_HEADER_LENGTH,
+        first * NUM_COLUMNS);
+    System.arraycopy(buffer, 0, out, CHUNK_HEADER_LENGTH + first * NUM_COLUMNS,
+        (samples - first) * NUM_COLUMNS);
+    sent += samples;
+
+    telemetryEntry.setDoubleArray(out);
+    lastPublishTime = Timer.getFPGATimestamp();
   }
 
   @Override
   public void disabledPeriodic() {
+    publishTelemetry();
+  }
+
+  /**
+  * Publishes a telemetry chunk once enough samples are buffered; while
+  * flushing, publishes the remaining samples and marks the last chunk. Chunks
+  * are published at most once per MIN_PUBLISH_PERIOD so that NetworkTables
+  * never coalesces two of them.
+  */
+  public void publishTelemetry() {
+    if (Timer.getFPGATimestamp() - lastPublishTime < MIN_PUBLISH_PERIOD) {
+      return;
+    }
+    if (flushing) {
+      boolean last = counter - sent <= CHUNK_SAMPLES;
+      sendTelemetryChunk(last);
+      flushing = !last;
+    } else if (counter - sent >= CHUNK_SAMPLES) {
+      sendTelemetryChunk(false);
+    }
   }
 
   @Override
   public void robotPeriodic() {
     // feedback for users, but not used by the control program
-    SmartDashboard.putNumber("l_encoder_pos", leftEncoderPosition.get());
-    SmartDashboard.putNumber("l_encoder_rate", leftEncoderRate.get());
-    SmartDashboard.putNumber("r_encoder_pos", rightEncoderPosition.get());
-    SmartDashboard.putNumber("r_encoder_rate", rightEncoderRate.get());
+    SmartDashboard.putNumber("l_encoder_pos", leftEncoderPosition.getAsDouble());
+    SmartDashboard.putNumber("l_encoder_rate", leftEncoderRate.getAsDouble());
+    SmartDashboard.putNumber("r_encoder_pos", rightEncoderPosition.getAsDouble());
+    SmartDashboard.putNumber("r_encoder_rate", rightEncoderRate.getAsDouble());
   }
 
   @Override
@@ -414,6 +479,9 @@ public class Robot extends TimedRobot {
     System.out.println("Robot in autonomous mode");
     startTime = Timer.getFPGATimestamp();
     counter = 0;
+    sent = 0;
+    chunkSequence = 0;
+    flushing = false;
   }
 
   /**
@@ -422,7 +490,8 @@ public class Robot extends TimedRobot {
   * ensure it gets called periodically in autonomous mode
   * 
   * Additionally, you need to set NetworkTables update rate to 10ms using the
-  * setUpdateRate call.
+  * setUpdateRate call, and call publishTelemetry() periodically while
+  * disabled (after setting flushing) so the remaining samples are sent.
   */
   @Override
   public void autonomousPeriodic() {
@@ -430,11 +499,11 @@ public class Robot extends TimedRobot {
     // Retrieve values to send back before telling the motors to do something
     double now = Timer.getFPGATimestamp();
 
-    double leftPosition = leftEncoderPosition.get();
-    double leftRate = leftEncoderRate.get();
+    double leftPosition = leftEncoderPosition.getAsDouble();
+    double leftRate = leftEncoderRate.getAsDouble();
 
-    double rightPosition = rightEncoderPosition.get();
-    double rightRate = rightEncoderRate.get();
+    double rightPosition = rightEncoderPosition.getAsDouble();
+    double rightRate = rightEncoderRate.getAsDouble();
 
     double battery = RobotController.getBatteryVoltage();
     double motorVolts = battery * Math.abs(priorAutospeed);
@@ -442,8 +511,16 @@ public class Robot extends TimedRobot {
     double leftMotorVolts = motorVolts;
     double rightMotorVolts = motorVolts;
 
-    // Retrieve the commanded speed from NetworkTables
-    double autospeed = autoSpeedEntry.getDouble(0);
+    // Retrieve the commanded speed from NetworkTables, or compute it from the
+    // test parameters if the data logger asked the robot to generate the ramp;
+    // this follows the robot period and isn't delayed by the network
+    double autospeed;
+    if (robotRampEntry.getBoolean(false)) {
+      autospeed = (rampStartEntry.getDouble(0)
+          + rampRateEntry.getDouble(0) * (now - startTime)) / 12;
+    } else {
+      autospeed = autoSpeedEntry.getDouble(0);
+    }
     priorAutospeed = autospeed;
 
     // command motors to do things
@@ -456,21 +533,20 @@ public class Robot extends TimedRobot {
     leaderMotor.set(autospeed);
     % endif
 
-    numberArray[0] = now;
-    numberArray[1] = battery;
-    numberArray[2] = autospeed;
-    numberArray[3] = leftMotorVolts;
-    numberArray[4] = rightMotorVolts;
-    numberArray[5] = leftPosition;
-    numberArray[6] = rightPosition;
-    numberArray[7] = leftRate;
-    numberArray[8] = rightRate;
-    numberArray[9] = gyroAngleRadians.get();
-
-    // Add data to a string that is uploaded to NT
-    for (double num : numberArray) {
-      entries.add(num);
-    }
+    // Record the sample in the ring buffer that is uploaded to NT
+    int offset = (counter % BUFFER_SAMPLES) * NUM_COLUMNS;
+    buffer[offset + 0] = now;
+    buffer[offset + 1] = battery;
+    buffer[offset + 2] = autospeed;
+    buffer[offset + 3] = leftMotorVolts;
+    buffer[offset + 4] = rightMotorVolts;
+    buffer[offset + 5] = leftPosition;
+    buffer[offset + 6] = rightPosition;
+    buffer[offset + 7] = leftRate;
+    buffer[offset + 8] = rightRate;
+    buffer[offset + 9] = gyroAngleRadians.getAsDouble();
     counter++;
+
+    publishTelemetry();
   }
 }
@@ -45,4 +45,7 @@
     # "new WPI_TalonSRX(3)" (Pigeon on a Talon SRX),
     # "" (NavX using default SPI, ADXRS450 using onboard CS0, or no gyro)
     "gyroPort": "",
+    # Number of samples the robot can buffer before they are sent to the data
+    # logger (5 ms per sample); only needs raising if telemetry is dropped
+    "telemetryBufferSamples": 2000,
 }
@@ -1,7 +1,6 @@
 # The GUI for running the data logger for each project.  As the GUI does not vary by project,
 # the logger runner is simply injected into this GUI.
 
-import json
 import os
 import queue
 import threading
@@ -10,8 +9,10 @@ import tkinter
 from tkinter import *
 import logging
 
+import numpy as np
 from networktables import NetworkTables
-from frc_characterization.newproject import Tests, Units
+from frc_characterization.logger_analyzer import data_file
+from frc_characterization.constants import Tests, Units
 from frc_characterization.utils import FloatEntry, IntEntry
 
 # GUI SETUP
@@ -81,10 +82,13 @@ def configure_gui(STATE, RUNNER):
     def getFile():
         file_path = tkinter.filedialog.asksaveasfilename(
             parent=STATE.mainGUI,
-            title="Choose the data file (.JSON)",
+            title="Choose the data file",
             initialdir=os.getcwd(),
-            defaultextension=".json",
-            filetypes=(("JSON", "*.json"),),
+            defaultextension=data_file.BINARY_EXTENSION,
+            filetypes=(
+                ("Characterization data", "*" + data_file.BINARY_EXTENSION),
+                ("JSON", "*" + data_file.JSON_EXTENSION),
+            ),
         )
         fileEntry.configure(state="normal")
         fileEntry.delete(0, END)
@@ -92,15 +96,17 @@ def configure_gui(STATE, RUNNER):
         fileEntry.configure(state="readonly")
 
     def save():
+        filename = STATE.file_path.get()
         if STATE.timestamp_enabled.get():
-            name, ext = os.path.splitext(STATE.file_path.get())
+            name, ext = os.path.splitext(filename)
             filename = name + time.strftime("%Y%m%d-%H%M") + ext
-        with open(filename, "w") as fp:
-            data = RUNNER.stored_data
-            data.update({"test": STATE.test.get()})
-            data.update({"units": STATE.units.get()})
-            data.update({"unitsPerRotation": STATE.units_per_rot.get()})
-            json.dump(data, fp, indent=4, separators=(",", ": "))
+        # Runs are stored by the logger one sample per row; the data file
+        # stores them one column per row
+        data = {name: np.transpose(run) for name, run in RUNNER.stored_data.items()}
+        data.update({"test": STATE.test.get()})
+        data.update({"units": STATE.units.get()})
+        data.update({"unitsPerRotation": STATE.units_per_rot.get()})
+        data_file.write(filename, data)
 
     def connect():
         if STATE.connect_handle:
@@ -252,6 +258,12 @@ def configure_gui(STATE, RUNNER):
     timestampEnabled = Checkbutton(topFrame, variable=STATE.timestamp_enabled)
     timestampEnabled.grid(row=1, column=2)
 
+    Label(topFrame, text="Robot-Side Ramp:", anchor="e").grid(
+        row=2, column=1, sticky="ew"
+    )
+    robotRampEnabled = Checkbutton(topFrame, variable=STATE.robot_ramp)
+    robotRampEnabled.grid(row=2, column=2)
+
     Label(topFrame, text="Test Type:", anchor="e").grid(row=1, column=3, sticky="ew")
 
     testTypeMenu = OptionMenu(
@@ -334,7 +346,9 @@ class GuiState:
         self.mainGUI = tkinter.Tk()
 
         self.file_path = StringVar(self.mainGUI)
-        self.file_path.set(os.path.join(dir, "characterization-data.json"))
+        self.file_path.set(
+            os.path.join(dir, "characterization-data" + data_file.BINARY_EXTENSION)
+        )
 
         self.timestamp_enabled = BooleanVar(self.mainGUI)
         self.timestamp_enabled.set(True)
@@ -374,6 +388,11 @@ class GuiState:
         self.angular_mode = BooleanVar(self.mainGUI)
         self.angular_mode.set(False)
 
+        # Whether the robot generates the test voltage from the test
+        # parameters, rather than following autospeed
+        self.robot_ramp = BooleanVar(self.mainGUI)
+        self.robot_ramp.set(False)
+
         self.units = StringVar(self.mainGUI)
         self.units.set(unit.value)
 
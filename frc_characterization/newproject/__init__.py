@@ -16,7 +16,6 @@ import time
 import glob
 import zipfile
 from datetime import datetime
-from enum import Enum
 from importlib import import_module
 from subprocess import PIPE, Popen, STDOUT
 from tkinter import *
@@ -28,42 +27,14 @@ import math
 import queue
 
 import frc_characterization
+from frc_characterization.constants import Tests, Units
 from frc_characterization.utils import IntEntry, TextExtension, FloatEntry
 import frc_characterization.robot as res
 
-import pint
-
 logger = logging.getLogger("logger")
 log_format = "%(asctime)s:%(msecs)03d %(levelname)-8s: %(name)-20s: %(message)s"
 
 
-class Tests(Enum):
-    ARM = "Arm"
-    ELEVATOR = "Elevator"
-    DRIVETRAIN = "Drivetrain"
-    SIMPLE_MOTOR = "Simple"
-
-
-class Units(Enum):
-    __ureg__ = pint.UnitRegistry()
-
-    FEET = "Feet", __ureg__.foot
-    METERS = "Meters", __ureg__.meter
-    INCHES = "Inches", __ureg__.inch
-    RADIANS = "Radians", __ureg__.radian
-    DEGREES = "Degrees", __ureg__.degree
-    ROTATIONS = "Rotations", __ureg__.revolution
-
-    def __new__(cls, *values):
-        obj = object.__new__(cls)
-        # first value is canonical value
-        obj._value_ = values[0]
-
-        # ureg value
-        obj.unit = values[1]
-        return obj
-
-
 class NewProjectGUI:
     def __init__(self, testType):
         self.mainGUI = tkinter.Tk()
@@ -393,11 +364,10 @@ class NewProjectGUI:
         def enableUnitPerRot(*args):
             units = self.units.get()
             if isRotation(units):
-                ureg = pint.UnitRegistry()
                 units = Units(units)
                 unitsRotationEntry.configure(state="readonly")
                 self.units_per_rot.set(
-                    round((1 * ureg.revolution).to(units.unit).magnitude, 3)
+                    round((1 * Units.ROTATIONS.unit).to(units.unit).magnitude, 3)
                 )
             else:
                 self.units_per_rot.set(0)
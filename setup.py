@@ -65,11 +65,8 @@ setuptools.setup(
     ],
     install_requires=[
         "numpy==1.19.3;platform_system=='Windows'",
-        "control",
-        "frccontrol",
         "matplotlib",
         "pynetworktables>=2018.1.2",
-        "statsmodels",
         "argcomplete",
         "console-menu",
         "mako",